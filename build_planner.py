@@ -0,0 +1,166 @@
+import re
+
+import numpy as np
+
+from utils import logger
+
+MAIN_BUILDING = 'Main Building'
+
+COST_COLUMNS = ["lumber", "clay", "iron", "crop", "culture_points", "time"]
+RESOURCE_COLUMNS = slice(0, 4)
+CULTURE_POINTS_COLUMN = 4
+TIME_COLUMN = 5
+
+
+def parse_duration(text):
+    seconds = 0
+    for part in str(text).split(':'):
+        seconds = seconds * 60 + int(part or 0)
+    return seconds
+
+
+def parse_percentage(text):
+    match = re.search(r'\d+(\.\d+)?', str(text or ''))
+    return float(match.group()) if match else None
+
+
+class BuildCostTable:
+    def __init__(self, buildings_level_info):
+        self.prefix_sums = {}
+        self.max_levels = {}
+        for name, levels in buildings_level_info.items():
+            costs = np.zeros((len(levels) + 1, len(COST_COLUMNS)), dtype=np.int64)
+            for level_info in levels:
+                row = costs[level_info["level"]]
+                row[:TIME_COLUMN] = [level_info[column] for column in COST_COLUMNS[:TIME_COLUMN]]
+                row[TIME_COLUMN] = parse_duration(level_info["time"])
+            self.prefix_sums[name] = np.cumsum(costs, axis=0)
+            self.max_levels[name] = len(levels)
+
+        self.main_building_factors = self.build_main_building_factors(buildings_level_info.get(MAIN_BUILDING, []))
+        # Time spent on Main Building levels 1..k, each one built at the previous Main Building level
+        main_building_times = np.diff(self.prefix_sums.get(MAIN_BUILDING, np.zeros((1, len(COST_COLUMNS))))
+                                      [:, TIME_COLUMN], prepend=0)
+        self.main_building_time_prefix = np.cumsum(main_building_times * self.main_building_factors[
+            np.maximum(np.arange(len(main_building_times)) - 1, 0)])
+
+    @staticmethod
+    def build_main_building_factors(levels):
+        # Build times in the table are at Main Building level 1, other levels scale them by their effect value
+        values = [parse_percentage(level_info["effect_value"]) for level_info in levels]
+        base = values[0] if values and values[0] else None
+        factors = np.ones(len(levels) + 1)
+        if base:
+            factors[1:] = [value / base if value else 1 for value in values]
+        return factors
+
+    def cost_of_range(self, building, from_level, to_level):
+        prefix = self.prefix_sums[building]
+        return prefix[to_level] - prefix[from_level]
+
+    def time_of_range(self, building, from_level, to_level, main_building_level=1):
+        if building == MAIN_BUILDING:
+            return float(self.main_building_time_prefix[to_level] - self.main_building_time_prefix[from_level])
+        factor = self.main_building_factors[min(main_building_level, len(self.main_building_factors) - 1)]
+        return float(self.cost_of_range(building, from_level, to_level)[TIME_COLUMN] * factor)
+
+
+def layout_from_buildings(buildings):
+    # VillageState.buildings maps slot -> (gid, name, level), the planner only needs the name and level
+    return {slot: (name, level) for slot, (_, name, level) in buildings.items()}
+
+
+def levels_by_name(layout):
+    levels = {}
+    for name, level in layout.values():
+        levels[name] = max(levels.get(name, 0), level)
+    return levels
+
+
+class BuildPlanner:
+    def __init__(self, buildings_level_info, buildings_requirements):
+        self.costs = BuildCostTable(buildings_level_info)
+        self.requirements = buildings_requirements
+
+    def resolve_requirements(self, current_layout, target_layout):
+        # Layouts map slot -> (name, level), a requirement is met by the highest level of that building in any slot
+        layout = dict(current_layout)
+        layout.update(target_layout)
+        free_slots = sorted(slot for slot, (name, level) in current_layout.items()
+                            if not name and not level and slot not in target_layout)
+
+        pending = [name for name, level in layout.values() if level > 0]
+        while pending:
+            building = pending.pop()
+            for required, level in self.requirements.get(building, {}).items():
+                if levels_by_name(layout).get(required, 0) >= level:
+                    continue
+
+                slots = [slot for slot, (name, _) in layout.items() if name == required]
+                if slots:
+                    slot = max(slots, key=lambda slot: layout[slot][1])
+                elif free_slots:
+                    slot = free_slots.pop(0)
+                else:
+                    logger.error("No free slot left for %s, required by %s", required, building)
+                    return None
+                layout[slot] = (required, level)
+                pending.append(required)
+        return layout
+
+    def requirements_met(self, building, layout):
+        levels = levels_by_name(layout)
+        return all(levels.get(required, 0) >= level for required, level in self.requirements.get(building, {}).items())
+
+    def plan(self, current_layout, target_layout):
+        # Resources and culture points don't depend on the order of the upgrades, so any order that respects the
+        # requirements is the cheapest. Main Building levels shorten every later build and nothing shortens them,
+        # so the fastest order does all Main Building upgrades first.
+        target = self.resolve_requirements(current_layout, target_layout)
+        if target is None:
+            return None
+        layout = {slot: current_layout.get(slot, (name, 0)) for slot, (name, _) in target.items()}
+
+        for slot, (building, level) in target.items():
+            if layout[slot][0] not in (building, '') and layout[slot][1]:
+                logger.error("Slot %s already holds %s, can't build %s there", slot, layout[slot][0], building)
+                return None
+            if level > self.costs.max_levels.get(building, 0):
+                logger.error("Building %s can't be upgraded to level %s", building, level)
+                return None
+
+        steps = []
+        total = np.zeros(len(COST_COLUMNS), dtype=np.float64)
+
+        def upgrade(slot):
+            building, to_level = target[slot]
+            from_level = layout[slot][1]
+            cost = self.costs.cost_of_range(building, from_level, to_level).astype(np.float64)
+            cost[TIME_COLUMN] = self.costs.time_of_range(building, from_level, to_level,
+                                                         levels_by_name(layout).get(MAIN_BUILDING, 1))
+            total[:] += cost
+            steps.extend((slot, building, level) for level in range(from_level + 1, to_level + 1))
+            layout[slot] = (building, to_level)
+
+        for slot, (building, level) in target.items():
+            if building == MAIN_BUILDING and layout[slot][1] < level:
+                upgrade(slot)
+
+        remaining = {slot for slot, (_, level) in target.items() if layout[slot][1] < level}
+        while remaining:
+            ready = sorted(slot for slot in remaining if self.requirements_met(target[slot][0], layout))
+            if not ready:
+                logger.error("Requirements can't be met for %s", ', '.join(sorted({target[slot][0]
+                                                                                   for slot in remaining})))
+                return None
+
+            for slot in ready:
+                upgrade(slot)
+                remaining.discard(slot)
+
+        return {
+            "steps": steps,
+            "resources": dict(zip(COST_COLUMNS[RESOURCE_COLUMNS], map(int, total[RESOURCE_COLUMNS]))),
+            "culture_points": int(total[CULTURE_POINTS_COLUMN]),
+            "time": float(total[TIME_COLUMN]),
+        }
@@ -1,20 +1,27 @@
+import ast
 import os
 import logging
 import mysql.connector
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from logging_setup import setup_logging, register_secret
+
+setup_logging()
 logger = logging.getLogger("Travian Database Logger")
 
 
-def get_connection_to_database():
+def get_connection_to_database(database=None):
     db_user, db_password = get_database_credentials()
-    logger.debug(f"Database user: {db_user}")
+    logger.debug("Database user: %s", db_user)
+
+    connection_arguments = {
+        "host": "localhost",
+        "user": db_user,
+        "password": db_password,
+    }
+    if database:
+        connection_arguments["database"] = database
 
-    return mysql.connector.connect(
-        host="localhost",
-        user=db_user,
-        password=db_password,
-    )
+    return mysql.connector.connect(**connection_arguments)
 
 
 def table_matches_columns(cursor, database, table, columns):
@@ -53,7 +60,7 @@ def create_table_if_doesnt_exist(cursor, database, table_name, columns, column_t
 def create_table(cursor, database, table_name, columns, column_types, additional_lines):
     cursor.execute(f"USE {database}")
 
-    logger.debug(f"Creating {table_name} database")
+    logger.debug("Creating %s database", table_name)
     query_beginning = f"CREATE TABLE {table_name} ("
 
     query_end = ")"
@@ -85,13 +92,13 @@ def recreate_table(cursor, database, table_name, columns, column_types, addition
 def recreate_table_if_columns_dont_match(cursor, database, table_name, columns, column_types, additional_lines,
                                          precedences=None):
     if not table_matches_columns(cursor, database, table_name, columns):
-        logger.debug(f"Table {table_name} has incorrect columns")
+        logger.debug("Table %s has incorrect columns", table_name)
         if precedences:
             for precedence in precedences:
                 recreate_table(cursor, database, **precedence)
         recreate_table(cursor, database, table_name, columns, column_types, additional_lines)
 
-    logger.debug(f"Table {table_name} has the correct columns")
+    logger.debug("Table %s has the correct columns", table_name)
 
 
 def get_database_credentials():
@@ -104,16 +111,18 @@ def get_database_credentials():
     try:
         with open(file_path, "r") as file:
             logger.debug("Database credentials file open")
-            return file.readline()[:-1], file.readline()
+            db_user, db_password = file.readline()[:-1], file.readline()
+            register_secret(db_password)
+            return db_user, db_password
     except FileNotFoundError as fnf:
         logger.error("Database credentials file not found")
-        logger.error(f"Error: {fnf}")
+        logger.error("Error: %s", fnf)
     except IOError as ioe:
         logger.error("IOError while trying to read the credentials file")
-        logger.error(f"Error: {ioe}")
+        logger.error("Error: %s", ioe)
     except Exception as err:
         logger.error("Unexpected error while trying to read the credentials file")
-        logger.error(f"Error: {err}")
+        logger.error("Error: %s", err)
 
 
 def insert_into(cursor, table, columns, values):
@@ -133,7 +142,7 @@ def insert_into(cursor, table, columns, values):
 
 
 def load_table(cursor, table_name, table_columns, entries):
-    logger.debug(f"Loading {table_name} table")
+    logger.debug("Loading %s table", table_name)
     for entry in entries:
         insert_into(cursor, table_name, table_columns, entry)
 
@@ -142,7 +151,7 @@ def load_table_if_empty(cursor, database, table_name, table_columns, entries):
     if is_empty(cursor, database, table_name):
         load_table(cursor, table_name, table_columns, entries)
     else:
-        logger.debug(f"Table {table_name} already has entries")
+        logger.debug("Table %s already has entries", table_name)
 
 
 def is_empty(cursor, database, table_name):
@@ -151,26 +160,19 @@ def is_empty(cursor, database, table_name):
     return cursor.fetchone()[0] == 0
 
 
-def get_login_info(server):
-    db_user, db_password = get_database_credentials()
-
-    logger.debug(f"Fetching login info for {server}")
-    logger.debug(f"Logging with user {db_user}, and password {db_password}")
-
-    conn = mysql.connector.connect(
-        host="localhost",
-        user=db_user,
-        password=db_password,
-    )
-    logger.debug(f"Connected to {conn}")
+def get_query_layer():
+    # Imported here, database.queries builds on this module
+    from database.queries import get_query_layer as get_shared_query_layer
+    return get_shared_query_layer()
 
-    cursor = conn.cursor()
 
-    cursor.execute("USE travian_login_info")
-    cursor.execute(f"SELECT * FROM info WHERE server = '{server}'")
+def get_login_info(server, account=None):
+    logger.debug("Fetching login info for %s", server)
 
-    credentials = cursor.fetchone()
-    return credentials[0], credentials[1]
+    login_info = get_query_layer().get_login_info(server, account)
+    if not login_info:
+        return None, None
+    return login_info.username, login_info.password
 
 
 def build_info_dict(result):
@@ -187,48 +189,67 @@ def build_info_dict(result):
         }
 
 
+# The single row lookups go through the shared prepared statements, the cursor argument is kept for existing callers
 def get_building_level_info(cursor, building, level, get_all_previous_levels=False):
-    cursor.execute("USE travian")
     if not get_all_previous_levels:
-        cursor.execute(f"SELECT * FROM buildings_level_info WHERE building = '{building} AND level = {level}'")
-        result = cursor.fetchone()
-
-        return build_info_dict(result)
-    else:
-        cursor.execute(f"SELECT * FROM buildings_level_info WHERE building = '{building}'")
-        results = cursor.fetchall()[:level - 1]
+        return build_info_dict(get_query_layer().get_building_level_info(building, level))
 
-        info = []
-        for result in results:
-            info.append(build_info_dict(result))
-
-        return info
+    return [build_info_dict(result) for result in get_query_layer().get_building_level_info(building, level, True)]
 
 
 def get_building_effect(cursor, building):
-    cursor.execute("USE travian")
-    cursor.execute(f"SELECT effect FROM buildings_effect WHERE name = {building}")
-    return cursor.fetchone()[0]
+    return get_query_layer().get_building_effect(building)
 
 
 def get_building_effect_value(cursor, building, level):
-    cursor.execute("USE travian")
-    cursor.execute(f"SELECT effect_value FROM buildings_level_info WHERE name = {building} AND level = {level}")
-    return cursor.fetchone()[0]
+    return get_query_layer().get_building_effect_value(building, level)
 
 
 def get_troop_price(cursor, troop):
-    cursor.execute("USE travian")
-    cursor.execute(f"SELECT * FROM troops_prices WHERE name = {troop}")
+    result = get_query_layer().get_troop_price(troop)
+
+    return {
+        "lumber": result.lumber,
+        "clay": result.clay,
+        "iron": result.iron,
+        "crop": result.crop,
+        "total_cost": result.total_cost,
+        "upkeep": result.upkeep,
+        "time": result.time,
+    }
 
-    result = cursor.fetchone()
 
+def build_troop_stats_dict(result):
     return {
-        "lumber": result[1],
-        "clay": result[2],
-        "iron": result[3],
-        "crop": result[4],
-        "total_cost": result[5],
-        "upkeep": result[6],
-        "time": result[7],
+        "attack": result[1],
+        "infantry_defence": result[2],
+        "cavalry_defense": result[3],
+        "speed": result[4],
+        "capacity": result[5],
     }
+
+
+def get_troops_stats(cursor):
+    cursor.execute("SELECT * FROM travian.troops_stats")
+
+    return {result[0]: build_troop_stats_dict(result) for result in cursor.fetchall()}
+
+
+def get_all_buildings_level_info(cursor):
+    cursor.execute("SELECT * FROM travian.buildings_level_info ORDER BY name, level")
+
+    info = {}
+    for result in cursor.fetchall():
+        level_info = build_info_dict(result)
+        level_info["level"] = result[1]
+        info.setdefault(result[0], []).append(level_info)
+    return info
+
+
+def get_buildings_requirements(cursor):
+    cursor.execute("SELECT * FROM travian.buildings_requirements")
+
+    requirements = {}
+    for name, buildings, levels in cursor.fetchall():
+        requirements[name] = dict(zip(ast.literal_eval(buildings), map(int, ast.literal_eval(levels))))
+    return requirements
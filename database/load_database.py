@@ -112,7 +112,7 @@ def load_database():
 
     end_time = time.time()
     execution_time = end_time - start_time
-    logger.debug(f'Total execution time: {execution_time:4f} seconds')
+    logger.debug('Total execution time: %4f seconds', execution_time)
 
 
 load_database()
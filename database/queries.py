@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import namedtuple
+
+import mysql.connector
+
+from database.db_utils import logger, get_connection_to_database
+from logging_setup import register_secret
+
+TRAVIAN_DATABASE_NAME = "travian"
+
+LoginInfo = namedtuple("LoginInfo", ["username", "password"])
+BuildingLevelInfo = namedtuple("BuildingLevelInfo", ["name", "level", "lumber", "clay", "iron", "crop", "total_cost",
+                                                     "upkeep", "culture_points", "time", "effect_value"])
+BuildingEffect = namedtuple("BuildingEffect", ["name", "effect"])
+TroopStats = namedtuple("TroopStats", ["name", "attack", "infantry_defence", "cavalry_defense", "speed", "capacity"])
+TroopPrice = namedtuple("TroopPrice", ["name", "lumber", "clay", "iron", "crop", "total_cost", "upkeep", "time"])
+
+# name: (statement, record type)
+STATEMENTS = {
+    "login_info": ("SELECT * FROM travian_login_info.info WHERE server = %s", LoginInfo),
+    "building_level_info": ("SELECT * FROM buildings_level_info WHERE name = %s AND level = %s", BuildingLevelInfo),
+    "building_previous_levels_info": ("SELECT * FROM buildings_level_info WHERE name = %s AND level < %s "
+                                      "ORDER BY level", BuildingLevelInfo),
+    "building_effect": ("SELECT name, effect FROM buildings_effect WHERE name = %s", BuildingEffect),
+    "building_effect_value": ("SELECT effect_value FROM buildings_level_info WHERE name = %s AND level = %s", None),
+    "troop_stats": ("SELECT * FROM troops_stats WHERE name = %s", TroopStats),
+    "troop_price": ("SELECT * FROM troops_prices WHERE name = %s", TroopPrice),
+}
+
+
+class QueryLayer:
+    def __init__(self, connection=None):
+        self.connection = connection or get_connection_to_database(TRAVIAN_DATABASE_NAME)
+        self.cursors = {}
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            for cursor in self.cursors.values():
+                cursor.close()
+            self.cursors = {}
+            self.connection.close()
+
+    def prepared_cursor(self, name):
+        # A prepared cursor keeps its statement prepared on the server, so each statement gets its own cursor
+        cursor = self.cursors.get(name)
+        if cursor is None:
+            logger.debug("Preparing statement %s", name)
+            cursor = self.connection.cursor(prepared=True)
+            self.cursors[name] = cursor
+        return cursor
+
+    def execute(self, name, parameters):
+        statement, _ = STATEMENTS[name]
+        with self.lock:
+            try:
+                cursor = self.prepared_cursor(name)
+                cursor.execute(statement, parameters)
+            except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError) as e:
+                # The layer is shared for the life of the process, so an idle connection the server dropped is
+                # reopened once and the statements prepared again
+                logger.warning("Lost the database connection (%s), reconnecting", e)
+                self.connection.reconnect()
+                self.cursors = {}
+                cursor = self.prepared_cursor(name)
+                cursor.execute(statement, parameters)
+            return cursor.fetchall()
+
+    @staticmethod
+    def to_record(record, row):
+        return record._make(row[:len(record._fields)]) if record else row[0]
+
+    def fetch_one(self, name, *parameters):
+        rows = self.execute(name, parameters)
+        if not rows:
+            return None
+
+        _, record = STATEMENTS[name]
+        return self.to_record(record, rows[0])
+
+    def fetch_all(self, name, *parameters):
+        _, record = STATEMENTS[name]
+        return [self.to_record(record, row) for row in self.execute(name, parameters)]
+
+    # LOOKUPS
+    def get_login_info(self, server, account=None):
+        # The login table's column names aren't known here, the account is matched on the first column like before
+        for login_info in self.fetch_all("login_info", server):
+            if account is None or login_info.username == account:
+                register_secret(login_info.password)
+                return login_info
+
+        logger.error("No login info for account %s on %s", account, server)
+        return None
+
+    def get_building_level_info(self, building, level, get_all_previous_levels=False):
+        if get_all_previous_levels:
+            return self.fetch_all("building_previous_levels_info", building, level)
+        return self.fetch_one("building_level_info", building, level)
+
+    def get_building_effect(self, building):
+        building_effect = self.fetch_one("building_effect", building)
+        return building_effect.effect if building_effect else None
+
+    def get_building_effect_value(self, building, level):
+        return self.fetch_one("building_effect_value", building, level)
+
+    def get_troop_stats(self, troop):
+        return self.fetch_one("troop_stats", troop)
+
+    def get_troop_price(self, troop):
+        return self.fetch_one("troop_price", troop)
+
+
+_query_layer = None
+_query_layer_lock = threading.Lock()
+
+
+def get_query_layer():
+    # Shared by the db_utils lookups, one per process
+    global _query_layer
+    with _query_layer_lock:
+        if _query_layer is None:
+            _query_layer = QueryLayer()
+        return _query_layer
+
+
+def benchmark_lookups(iterations=10000, building="Main Building", troop="Legionnaire"):
+    # Needs a local database loaded by load_database.py, run with python -m database.queries
+    query_layer = QueryLayer()
+    conn = get_connection_to_database()
+    cursor = conn.cursor()
+
+    def measure(lookup):
+        start_time = time.perf_counter()
+        for i in range(iterations):
+            lookup(i % 20 + 1)
+        return iterations / (time.perf_counter() - start_time)
+
+    def unprepared_lookup(level):
+        cursor.execute("USE travian")
+        cursor.execute(f"SELECT * FROM buildings_level_info WHERE name = '{building}' AND level = {level}")
+        cursor.fetchall()
+
+    results = {
+        "unprepared, USE per call": measure(unprepared_lookup),
+        "prepared building level info": measure(lambda level: query_layer.get_building_level_info(building, level)),
+        "prepared troop price": measure(lambda _: query_layer.get_troop_price(troop)),
+    }
+
+    cursor.close()
+    conn.close()
+    query_layer.close()
+
+    for name, lookups_per_second in results.items():
+        print(f"{name}: {lookups_per_second:.0f} lookups per second")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_lookups()
@@ -0,0 +1,66 @@
+from database.db_utils import logger, create_table_if_doesnt_exist
+
+TRAVIAN_DATABASE_NAME = "travian"
+
+reports = {
+    "table_name": "reports",
+    "columns": ["server", "report_id", "received", "x", "y", "lumber", "clay", "iron", "crop", "capacity",
+                "troops_sent", "troops_lost", "defended"],
+    "column_types": ["VARCHAR(30) NOT NULL", "BIGINT NOT NULL", "VARCHAR(30)", "INT", "INT", "INT NOT NULL",
+                     "INT NOT NULL", "INT NOT NULL", "INT NOT NULL", "INT NOT NULL", "INT NOT NULL", "INT NOT NULL",
+                     "BOOLEAN NOT NULL"],
+    "additional_lines": "PRIMARY KEY (server, report_id),\nINDEX (x, y)"
+}
+
+reports_watermarks = {
+    "table_name": "reports_watermarks",
+    "columns": ["server", "report_id"],
+    "column_types": ["VARCHAR(30) PRIMARY KEY", "BIGINT NOT NULL"],
+    "additional_lines": ""
+}
+
+
+def setup_reports_tables(cursor):
+    create_table_if_doesnt_exist(cursor, TRAVIAN_DATABASE_NAME, **reports)
+    create_table_if_doesnt_exist(cursor, TRAVIAN_DATABASE_NAME, **reports_watermarks)
+
+
+def get_reports_watermark(cursor, server):
+    cursor.execute(f"USE {TRAVIAN_DATABASE_NAME}")
+    cursor.execute("SELECT report_id FROM reports_watermarks WHERE server = %s", (server,))
+    result = cursor.fetchone()
+    return result[0] if result else 0
+
+
+def set_reports_watermark(cursor, server, report_id):
+    cursor.execute(f"USE {TRAVIAN_DATABASE_NAME}")
+    cursor.execute("INSERT INTO reports_watermarks (server, report_id) VALUES (%s, %s) "
+                   "ON DUPLICATE KEY UPDATE report_id = GREATEST(report_id, VALUES(report_id))", (server, report_id))
+
+
+def get_newest_report_id(cursor, server):
+    cursor.execute(f"USE {TRAVIAN_DATABASE_NAME}")
+    cursor.execute(f"SELECT MAX(report_id) FROM {reports['table_name']} WHERE server = %s", (server,))
+    result = cursor.fetchone()
+    return result[0] if result and result[0] is not None else 0
+
+
+def get_stored_report_ids(cursor, server, report_ids):
+    if not report_ids:
+        return set()
+
+    cursor.execute(f"USE {TRAVIAN_DATABASE_NAME}")
+    cursor.execute(f"SELECT report_id FROM {reports['table_name']} WHERE server = %s "
+                   f"AND report_id IN ({', '.join(['%s'] * len(report_ids))})", (server, *report_ids))
+    return {result[0] for result in cursor.fetchall()}
+
+
+def insert_reports(cursor, rows):
+    if not rows:
+        return
+
+    columns = reports["columns"]
+    query = (f"INSERT IGNORE INTO {reports['table_name']} ({', '.join(columns)}) "
+             f"VALUES ({', '.join(['%s'] * len(columns))})")
+    logger.debug("Inserting %s reports", len(rows))
+    cursor.executemany(query, [tuple(row[column] for column in columns) for row in rows])
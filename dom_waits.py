@@ -0,0 +1,146 @@
+import os
+import tempfile
+
+from selenium import webdriver
+from selenium.common.exceptions import JavascriptException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from utils import logger
+
+# Resolves with the matching element(s) as soon as they are in the DOM, or null once the timeout runs out
+WAIT_FOR_SCRIPT = """
+const [by, value, findAll, timeout] = arguments;
+const callback = arguments[arguments.length - 1];
+
+const find = () => {
+    let found = [];
+    if (by === 'xpath') {
+        const result = document.evaluate(value, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < result.snapshotLength; i++) {
+            found.push(result.snapshotItem(i));
+        }
+    } else if (by === 'id') {
+        found = [document.getElementById(value)].filter(Boolean);
+    } else if (by === 'class name') {
+        found = Array.from(document.getElementsByClassName(value));
+    } else if (by === 'tag name') {
+        found = Array.from(document.getElementsByTagName(value));
+    } else if (by === 'name') {
+        found = Array.from(document.getElementsByName(value));
+    } else {
+        found = Array.from(document.querySelectorAll(value));
+    }
+    if (!found.length) {
+        return null;
+    }
+    return findAll ? found : found[0];
+};
+
+const initial = find();
+if (initial) {
+    callback(initial);
+    return;
+}
+
+let done = false;
+const finish = result => {
+    if (done) {
+        return;
+    }
+    done = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    callback(result);
+};
+const observer = new MutationObserver(() => {
+    const found = find();
+    if (found) {
+        finish(found);
+    }
+});
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+const timer = setTimeout(() => finish(null), timeout);
+"""
+
+SUPPORTED_LOCATORS = {By.XPATH, By.ID, By.CLASS_NAME, By.TAG_NAME, By.NAME, By.CSS_SELECTOR}
+
+
+def wait_for(driver, locator, timeout, find_all=False, fallback=None):
+    by, value = locator
+    if by in SUPPORTED_LOCATORS:
+        try:
+            found = driver.execute_async_script(WAIT_FOR_SCRIPT, by, value, find_all, int(timeout * 1000))
+        except JavascriptException as e:
+            logger.debug("Observer wait failed for %s, polling instead: %s", value, e)
+        else:
+            if not found:
+                raise TimeoutException(f"{value} didn't appear within {timeout} seconds")
+            return found
+
+    wait = fallback or WebDriverWait(driver, timeout)
+    condition = EC.presence_of_all_elements_located if find_all else EC.presence_of_element_located
+    return wait.until(condition(locator))
+
+
+FIXTURE_PAGE = """
+<html>
+<body>
+<div id="villageContent"></div>
+<script>
+const delay = parseInt(new URLSearchParams(location.search).get('delay') || '0', 10);
+setTimeout(() => {
+    const table = document.createElement('table');
+    table.id = 'troop_info';
+    table.innerHTML = '<tbody><tr><td>none</td></tr></tbody>';
+    document.getElementById('villageContent').appendChild(table);
+    window.appearedAt = performance.now();
+}, delay);
+</script>
+</body>
+</html>
+"""
+
+
+def benchmark_waits(iterations=20, delay=300):
+    # Latency between the element appearing in the fixture page and the wait returning, needs Firefox
+    locator = (By.XPATH, '//table[@id="troop_info"]/tbody/tr[1]/td')
+
+    with tempfile.NamedTemporaryFile('w', suffix='.html', delete=False) as fixture:
+        fixture.write(FIXTURE_PAGE)
+    url = f"file://{fixture.name}?delay={delay}"
+
+    options = webdriver.FirefoxOptions()
+    options.add_argument('--headless')
+    driver = webdriver.Firefox(options=options)
+
+    def measure(wait):
+        # Both measurements include the same round trip for reading the page clock
+        latencies = []
+        for _ in range(iterations):
+            driver.get(url)
+            wait()
+            latencies.append(driver.execute_script("return performance.now() - window.appearedAt;"))
+        return sum(latencies) / len(latencies)
+
+    try:
+        results = {
+            "WebDriverWait polling": measure(lambda: WebDriverWait(driver, 4).until(
+                EC.presence_of_element_located(locator))),
+            "MutationObserver": measure(lambda: wait_for(driver, locator, 4)),
+        }
+    except WebDriverException as e:
+        logger.error("Benchmark failed: %s", e)
+        results = {}
+    finally:
+        driver.quit()
+        os.remove(fixture.name)
+
+    for name, latency in results.items():
+        print(f"{name}: {latency:.1f} ms after the element appeared")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_waits()
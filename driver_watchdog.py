@@ -0,0 +1,200 @@
+import concurrent.futures
+import threading
+import time
+
+from selenium.webdriver.common.by import By
+
+from utils import logger
+from rate_limiter import Priority
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_INTERVAL = 30
+DEFAULT_PING_TIMEOUT = 10
+DEFAULT_MEMORY_LIMIT = 1500 * 1024 * 1024
+QUIT_TIMEOUT = 15
+
+PING_SCRIPT = "return document.readyState;"
+
+
+def get_driver_processes(driver):
+    if not psutil:
+        return []
+
+    processes = []
+    service = getattr(driver, 'service', None)
+    pids = [service.process.pid if service and service.process else None, driver.capabilities.get('moz:processID')]
+    for pid in filter(None, pids):
+        try:
+            process = psutil.Process(pid)
+            processes.append(process)
+            processes.extend(process.children(recursive=True))
+        except psutil.Error:
+            continue
+    return list({process.pid: process for process in processes}.values())
+
+
+def get_driver_rss(driver):
+    rss = 0
+    for process in get_driver_processes(driver):
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return rss
+
+
+def kill_driver_processes(processes):
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.Error:
+            continue
+
+
+class DriverWatchdog:
+    def __init__(self, selenium_manager, interval=DEFAULT_INTERVAL, ping_timeout=DEFAULT_PING_TIMEOUT,
+                 memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.selenium_manager = selenium_manager
+        self.interval = interval
+        self.ping_timeout = ping_timeout
+        self.memory_limit = memory_limit
+
+        # Pings get their own threads, a hung driver must never tie up the shared executor
+        self.ping_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="watchdog-ping")
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self.last_urls = {}
+        self.cookies = {}
+        self.events = []
+
+        if not psutil:
+            logger.warning("psutil isn't installed, browser memory won't be monitored")
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="driver-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.ping_executor.shutdown(wait=False)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            for server, driver in list(self.selenium_manager.drivers.items()):
+                if driver:
+                    self.check(server, driver)
+
+    def ping(self, driver):
+        state = driver.execute_script(PING_SCRIPT)
+        return state, driver.current_url, driver.get_cookies()
+
+    def check(self, server, driver):
+        future = self.ping_executor.submit(self.ping, driver)
+        try:
+            _, url, cookies = future.result(timeout=self.ping_timeout)
+        except concurrent.futures.TimeoutError:
+            self.recycle(server, driver, "unresponsive")
+            return
+        except Exception as e:
+            self.recycle(server, driver, f"ping failed: {e}")
+            return
+
+        self.last_urls[server] = url
+        self.cookies[server] = cookies
+
+        rss = get_driver_rss(driver)
+        logger.debug("Driver for %s is responsive, using %s MB", server, rss // (1024 * 1024))
+        if self.memory_limit and rss > self.memory_limit:
+            self.recycle_when_idle(server, driver, f"using {rss // (1024 * 1024)} MB")
+
+    def recycle_when_idle(self, server, driver, reason):
+        # A bloated driver still works, so it is only recycled between operations, never under one. A busy driver
+        # is checked again on the next round.
+        lock = self.selenium_manager.driver_locks[server]
+        if not lock.acquire(blocking=False):
+            logger.info("Driver for %s is busy, recycling it later (%s)", server, reason)
+            return
+        try:
+            self.recycle(server, driver, reason)
+        finally:
+            lock.release()
+
+    def quit_driver(self, driver):
+        processes = get_driver_processes(driver)
+        future = self.ping_executor.submit(driver.quit)
+        try:
+            future.result(timeout=QUIT_TIMEOUT)
+        except Exception as e:
+            logger.warning("Driver didn't quit cleanly (%s), killing its processes", e)
+            kill_driver_processes(processes)
+
+    def restore_session(self, server):
+        manager = self.selenium_manager
+        driver = manager.get_driver(server)
+
+        for cookie in self.cookies.get(server, []):
+            try:
+                driver.add_cookie(cookie)
+            except Exception as e:
+                logger.debug("Could not restore cookie %s: %s", cookie.get('name'), e)
+        # Reloaded through the manager so it goes through the rate limiter, assuming the cookies kept us logged in
+        manager.is_logged_in[server] = True
+        driver = manager.load_url(server, driver.current_url, Priority.URGENT)
+
+        manager.is_logged_in[server] = not driver.find_elements(By.NAME, 'password')
+        driver = manager.get_logged_in_driver(server)
+
+        last_url = self.last_urls.get(server)
+        if last_url and driver.current_url != last_url:
+            manager.load_url(server, last_url)
+
+    def recycle(self, server, driver, reason):
+        # Called directly only for unresponsive drivers, which are no use to whatever is running on them anyway
+        with self.lock:
+            if self.selenium_manager.drivers.get(server) is not driver:
+                return
+
+            logger.warning("Recycling driver for %s: %s", server, reason)
+            start_time = time.time()
+            rss = get_driver_rss(driver) if psutil else None
+
+            manager = self.selenium_manager
+            manager.drivers[server] = None
+            manager.waits[server] = None
+            manager.is_logged_in[server] = False
+            self.quit_driver(driver)
+
+            try:
+                self.restore_session(server)
+                restored = True
+            except Exception as e:
+                logger.error("Could not restore session for %s: %s", server, e)
+                restored = False
+
+            downtime = time.time() - start_time
+            self.events.append({
+                "server": server,
+                "reason": reason,
+                "rss": rss,
+                "time": start_time,
+                "downtime": downtime,
+                "restored": restored,
+            })
+            logger.warning("Driver for %s recycled in %.1f seconds", server, downtime)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "recycles": len(self.events),
+                "downtime": sum(event["downtime"] for event in self.events),
+                "events": list(self.events),
+            }
@@ -0,0 +1,212 @@
+import numpy as np
+
+from utils import logger, log_execution_time
+from map_scanner import MAP_RADIUS, wrap_distance
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+DEFAULT_RESOLUTION = 60
+
+OASIS_PRODUCTION = 40 * 4
+OASIS_CAPACITY = 1000 * 4
+ANIMALS_MAX = 30
+ANIMAL_DEFENCE = 40
+ANIMAL_RESPAWN_PER_HOUR = 0.02
+
+
+def raid_losses(attack, defence):
+    # Raid casualty formula, returns the fraction of attackers and defenders lost
+    with np.errstate(divide='ignore', invalid='ignore'):
+        attacker_wins = attack > defence
+        ratio = np.where(attacker_wins, defence / attack, attack / defence) ** 1.5
+        winner_losses = ratio / (1 + ratio)
+        loser_losses = 1 / (1 + ratio)
+        attacker_losses = np.where(attacker_wins, winner_losses, loser_losses)
+        defender_losses = np.where(attacker_wins, loser_losses, winner_losses)
+    no_defence = defence <= 0
+    return np.where(no_defence, 0, attacker_losses), np.where(no_defence, 1, defender_losses)
+
+
+class Strategy:
+    def __init__(self, name, check_interval=HOUR, cache_ttl=0, troops_per_raid=5, farm_list_size=100):
+        self.name = name
+        self.check_interval = check_interval
+        self.cache_ttl = cache_ttl
+        self.troops_per_raid = troops_per_raid
+        self.farm_list_size = farm_list_size
+
+    def __str__(self):
+        return self.name
+
+
+class Oases:
+    def __init__(self, xs, ys, rng, production=OASIS_PRODUCTION, capacity=OASIS_CAPACITY,
+                 animals_max=ANIMALS_MAX, respawn_per_hour=ANIMAL_RESPAWN_PER_HOUR):
+        count = len(xs)
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        self.production = np.full(count, production / HOUR)
+        self.capacity = np.full(count, float(capacity))
+        self.resources = self.capacity.copy()
+        self.animals_max = np.full(count, float(animals_max))
+        self.animals = np.floor(rng.random(count) * 2) * rng.random(count) * self.animals_max
+        self.respawn_rate = respawn_per_hour / HOUR
+        self.rng = rng
+        self.initial_state = (self.resources.copy(), self.animals.copy())
+
+    def reset(self, rng):
+        self.resources = self.initial_state[0].copy()
+        self.animals = self.initial_state[1].copy()
+        self.rng = rng
+
+    @classmethod
+    def random(cls, count, rng, **kwargs):
+        coordinates = rng.integers(-MAP_RADIUS, MAP_RADIUS + 1, size=(2, count))
+        return cls(coordinates[0], coordinates[1], rng, **kwargs)
+
+    @classmethod
+    def from_index(cls, index, rng, **kwargs):
+        return cls(index.xs, index.ys, rng, **kwargs)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def advance(self, seconds):
+        np.minimum(self.resources + self.production * seconds, self.capacity, out=self.resources)
+
+        respawned = self.rng.random(len(self)) < -np.expm1(-self.respawn_rate * seconds)
+        self.animals[respawned] = self.animals_max[respawned] * (0.5 + 0.5 * self.rng.random(respawned.sum()))
+
+
+class FarmingSimulator:
+    def __init__(self, oases, villages, troops_stats, troop, server_speed=1, seed=0):
+        self.oases = oases
+        self.village_names = list(villages.keys())
+        self.village_coordinates = np.array([villages[name]["coordinates"] for name in self.village_names],
+                                            dtype=np.float64)
+        self.initial_troops = np.array([villages[name]["troops"] for name in self.village_names], dtype=np.int64)
+
+        stats = troops_stats[troop]
+        self.speed = stats["speed"] * server_speed
+        self.capacity = stats["capacity"]
+        self.attack = stats["attack"]
+
+        # Shape (villages, oases)
+        self.distances = wrap_distance(self.village_coordinates[:, 0, None], self.village_coordinates[:, 1, None],
+                                       oases.xs[None, :], oases.ys[None, :])
+        self.farm_lists = np.argsort(self.distances, axis=1, kind='stable')
+        self.seed = seed
+
+    @log_execution_time
+    def run(self, strategy, duration=30 * DAY, resolution=DEFAULT_RESOLUTION):
+        oases = self.oases
+        oases.reset(np.random.default_rng(self.seed))
+
+        troops = self.initial_troops.copy()
+        farm_lists = self.farm_lists[:, :strategy.farm_list_size]
+        travel_times = self.distances / self.speed * HOUR
+
+        observed_at = np.full(len(oases), -np.inf)
+        observed_undefended = np.zeros(len(oases), dtype=bool)
+        targeted = np.zeros(len(oases), dtype=bool)
+
+        # In flight raids as parallel arrays
+        raid_villages = np.empty(0, dtype=np.int64)
+        raid_targets = np.empty(0, dtype=np.int64)
+        raid_troops = np.empty(0, dtype=np.int64)
+        raid_arrivals = np.empty(0)
+        raid_returns = np.empty(0)
+        raid_loot = np.empty(0)
+        raid_arrived = np.empty(0, dtype=bool)
+
+        totals = {"loot": 0.0, "troops_lost": 0, "raids": 0, "checks": 0, "defended_raids": 0}
+
+        now = 0.0
+        next_check = 0.0
+        while now < duration:
+            pending_events = np.concatenate([raid_arrivals[~raid_arrived], raid_returns, [next_check, duration]])
+            next_time = max(pending_events.min(), now + resolution)
+            oases.advance(next_time - now)
+            now = next_time
+
+            arriving = ~raid_arrived & (raid_arrivals <= now)
+            if arriving.any():
+                # Farms are never targeted twice while a raid is on its way, so targets in a batch are unique
+                indices = np.flatnonzero(arriving)
+                targets = raid_targets[indices]
+
+                attack = raid_troops[indices] * self.attack
+                defence = oases.animals[targets] * ANIMAL_DEFENCE
+                attacker_losses, defender_losses = raid_losses(attack, defence)
+
+                lost = np.round(raid_troops[indices] * attacker_losses).astype(np.int64)
+                raid_troops[indices] -= lost
+                oases.animals[targets] *= 1 - defender_losses
+
+                loot = np.minimum(raid_troops[indices] * self.capacity, oases.resources[targets])
+                oases.resources[targets] -= loot
+                raid_loot[indices] = loot
+                raid_arrived[indices] = True
+                targeted[targets] = False
+
+                totals["troops_lost"] += int(lost.sum())
+                totals["defended_raids"] += int((defence > 0).sum())
+
+            returning = raid_returns <= now
+            if returning.any():
+                np.add.at(troops, raid_villages[returning], raid_troops[returning])
+                totals["loot"] += float(raid_loot[returning].sum())
+
+                keep = ~returning
+                raid_villages, raid_targets, raid_troops = raid_villages[keep], raid_targets[keep], raid_troops[keep]
+                raid_arrivals, raid_returns = raid_arrivals[keep], raid_returns[keep]
+                raid_loot, raid_arrived = raid_loot[keep], raid_arrived[keep]
+
+            if now >= next_check:
+                next_check = now + strategy.check_interval
+
+                candidates = np.unique(farm_lists)
+                stale = candidates[now - observed_at[candidates] >= strategy.cache_ttl]
+                observed_at[stale] = now
+                observed_undefended[stale] = oases.animals[stale] < 1
+                totals["checks"] += len(stale)
+
+                for village in range(len(self.village_names)):
+                    raids = troops[village] // strategy.troops_per_raid
+                    if not raids:
+                        continue
+
+                    farm_list = farm_lists[village]
+                    chosen = farm_list[observed_undefended[farm_list] & ~targeted[farm_list]][:raids]
+                    if not len(chosen):
+                        continue
+
+                    targeted[chosen] = True
+                    troops[village] -= len(chosen) * strategy.troops_per_raid
+                    totals["raids"] += len(chosen)
+
+                    travel = travel_times[village, chosen]
+                    raid_villages = np.concatenate([raid_villages, np.full(len(chosen), village)])
+                    raid_targets = np.concatenate([raid_targets, chosen])
+                    raid_troops = np.concatenate([raid_troops, np.full(len(chosen), strategy.troops_per_raid)])
+                    raid_arrivals = np.concatenate([raid_arrivals, now + travel])
+                    raid_returns = np.concatenate([raid_returns, now + 2 * travel])
+                    raid_loot = np.concatenate([raid_loot, np.zeros(len(chosen))])
+                    raid_arrived = np.concatenate([raid_arrived, np.zeros(len(chosen), dtype=bool)])
+
+        hours = duration / HOUR
+        result = {
+            "strategy": strategy.name,
+            "loot_per_hour": totals["loot"] / hours,
+            "losses_per_hour": totals["troops_lost"] / hours,
+            "checks_per_hour": totals["checks"] / hours,
+            **totals,
+        }
+        logger.info("Strategy %s: %.0f loot per hour, %s troops lost", strategy.name, result["loot_per_hour"],
+                    totals["troops_lost"])
+        return result
+
+    def compare(self, strategies, duration=30 * DAY, resolution=DEFAULT_RESOLUTION):
+        results = [self.run(strategy, duration, resolution) for strategy in strategies]
+        return sorted(results, key=lambda result: result["loot_per_hour"], reverse=True)
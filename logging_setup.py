@@ -0,0 +1,153 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = logging.INFO
+REDACTED = '***'
+
+SECRET_PATTERN = re.compile(r'(password|passwd|token|secret)(\s*[=:]\s*)(\S+)', re.IGNORECASE)
+
+log_context = contextvars.ContextVar("log_context", default={})
+
+secrets = set()
+secrets_lock = threading.Lock()
+
+listener = None
+listener_lock = threading.Lock()
+
+
+def register_secret(value):
+    if value:
+        with secrets_lock:
+            secrets.add(str(value))
+
+
+def redact(message):
+    with secrets_lock:
+        known_secrets = list(secrets)
+    for secret in known_secrets:
+        message = message.replace(secret, REDACTED)
+    return SECRET_PATTERN.sub(lambda match: f"{match.group(1)}{match.group(2)}{REDACTED}", message)
+
+
+@contextmanager
+def logging_context(**fields):
+    token = log_context.set({**log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    # Runs on the emitting thread, which is the only place the context variables are visible
+    def filter(self, record):
+        record.context = log_context.get()
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    # The stock handler formats the message before queueing it, we leave that to the listener thread
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": redact(record.getMessage()),
+        }
+        entry.update(getattr(record, "context", {}))
+        if record.exc_info:
+            entry["exception"] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level=LOG_LEVEL, handler=None):
+    global listener
+
+    with listener_lock:
+        if listener:
+            return
+
+        output = handler or logging.StreamHandler()
+        output.setFormatter(JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+
+        listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    global listener
+
+    with listener_lock:
+        if not listener:
+            return
+        listener.stop()
+        listener = None
+
+
+def benchmark_logging(iterations=100000):
+    # Per call cost paid by the farm loop thread for the kinds of log calls it makes
+    farms = [f"farm {i}" for i in range(100)]
+    logger = logging.getLogger("Travian Benchmark Logger")
+
+    def measure(log_call):
+        start_time = time.perf_counter()
+        for i in range(iterations):
+            log_call(farms[i % len(farms)])
+        return (time.perf_counter() - start_time) / iterations * 1e9
+
+    root = logging.getLogger()
+    original_handlers = root.handlers[:]
+    original_level = root.level
+    results = {}
+
+    sync_handler = logging.StreamHandler(open(os.devnull, "w"))
+    sync_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root.handlers = [sync_handler]
+    root.setLevel(logging.INFO)
+    results["disabled debug, f-string"] = measure(lambda farm: logger.debug(f"Checking {farm}"))
+    results["disabled debug, lazy arguments"] = measure(lambda farm: logger.debug("Checking %s", farm))
+    results["info, synchronous handler"] = measure(lambda farm: logger.info("Selected farm %s", farm))
+
+    root.handlers = []
+    queued_handler = logging.StreamHandler(open(os.devnull, "w"))
+    setup_logging(logging.INFO, queued_handler)
+    with logging_context(server="benchmark", job=1):
+        results["info, queued handler"] = measure(lambda farm: logger.info("Selected farm %s", farm))
+    stop_logging()
+
+    sync_handler.stream.close()
+    queued_handler.stream.close()
+    root.handlers = original_handlers
+    root.setLevel(original_level)
+
+    for name, nanoseconds in results.items():
+        print(f"{name}: {nanoseconds:.0f} ns per call")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_logging()
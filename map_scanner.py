@@ -0,0 +1,224 @@
+import re
+
+import numpy as np
+from selenium.webdriver.common.by import By
+
+from utils import logger, log_execution_time
+from selenium_manager import PageNames
+from rate_limiter import throttle, Priority
+
+MAP_RADIUS = 200
+MAP_WIDTH = 2 * MAP_RADIUS + 1
+MAP_BLOCK_SIZE = 30
+MAP_ZOOM_LEVEL = 3
+MAP_POSITION_ENDPOINT = '/api/v1/map/position'
+
+BUCKET_SIZE = 20
+
+UNOCCUPIED_OASIS_TITLE = '{k.fo}'
+OCCUPIED_OASIS_TITLE = '{k.bt}'
+
+RESOURCES = ['lumber', 'clay', 'iron', 'crop']
+
+FETCH_MAP_POSITION_SCRIPT = """
+const callback = arguments[arguments.length - 1];
+fetch(arguments[0], {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest'},
+    body: JSON.stringify({data: {x: arguments[1], y: arguments[2], zoomLevel: arguments[3], ignorePositions: []}})
+}).then(response => response.json()).then(callback).catch(error => callback({error: String(error)}));
+"""
+
+
+def wrap_coordinate(value):
+    return (value + MAP_RADIUS) % MAP_WIDTH - MAP_RADIUS
+
+
+def wrap_distance(x1, y1, x2, y2):
+    # Coordinates are stored as int16, squaring them there overflows past ~181 fields
+    dx = np.abs(np.asarray(x1, dtype=np.int32) - x2)
+    dy = np.abs(np.asarray(y1, dtype=np.int32) - y2)
+    dx = np.minimum(dx, MAP_WIDTH - dx)
+    dy = np.minimum(dy, MAP_WIDTH - dy)
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def parse_coordinate(text):
+    cleaned = re.sub(r'[^\d\-]', '', text.replace('−', '-'))
+    return int(cleaned)
+
+
+def parse_oasis_bonus(text):
+    bonus = np.zeros(len(RESOURCES), dtype=np.uint8)
+    for resource, percentage in re.findall(r'\{a\.r(\d)\}\s*(\d+)%', text or ''):
+        bonus[int(resource) - 1] += int(percentage)
+    return bonus
+
+
+def parse_oasis_tiles(tiles):
+    oases = {}
+    for tile in tiles:
+        title = tile.get('title')
+        if title not in (UNOCCUPIED_OASIS_TITLE, OCCUPIED_OASIS_TITLE):
+            continue
+
+        position = tile['position']
+        oases[(int(position['x']), int(position['y']))] = (parse_oasis_bonus(tile.get('text')),
+                                                            title == OCCUPIED_OASIS_TITLE)
+    return oases
+
+
+class OasisIndex:
+    def __init__(self, xs, ys, bonuses, occupied):
+        self.xs = np.asarray(xs, dtype=np.int16)
+        self.ys = np.asarray(ys, dtype=np.int16)
+        self.bonuses = np.asarray(bonuses, dtype=np.uint8).reshape(-1, len(RESOURCES))
+        self.occupied = np.asarray(occupied, dtype=bool)
+
+        self.buckets_per_side = -(-MAP_WIDTH // BUCKET_SIZE)
+        # The last bucket on each axis is narrower when the map width isn't a multiple of the bucket size
+        self.seam_slack = self.buckets_per_side * BUCKET_SIZE - MAP_WIDTH
+
+        self.buckets = {}
+        bucket_xs = self.bucket_of(self.xs)
+        bucket_ys = self.bucket_of(self.ys)
+        keys = bucket_xs.astype(np.int32) * self.buckets_per_side + bucket_ys
+        order = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        for key, indices in zip(unique_keys, np.split(order, starts[1:])):
+            self.buckets[divmod(int(key), self.buckets_per_side)] = indices
+
+    @classmethod
+    def from_oases(cls, oases):
+        positions = list(oases.keys())
+        return cls([x for x, _ in positions], [y for _, y in positions],
+                   [oases[position][0] for position in positions], [oases[position][1] for position in positions])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['xs'], data['ys'], data['bonuses'], data['occupied'])
+
+    def save(self, path):
+        np.savez_compressed(path, xs=self.xs, ys=self.ys, bonuses=self.bonuses, occupied=self.occupied)
+
+    def __len__(self):
+        return len(self.xs)
+
+    @staticmethod
+    def bucket_of(coordinates):
+        return (np.asarray(coordinates, dtype=np.int32) + MAP_RADIUS) // BUCKET_SIZE
+
+    def ring(self, bucket_x, bucket_y, radius):
+        if radius == 0:
+            return [(bucket_x, bucket_y)]
+
+        cells = set()
+        for offset in range(-radius, radius + 1):
+            for dx, dy in ((offset, -radius), (offset, radius), (-radius, offset), (radius, offset)):
+                cells.add(((bucket_x + dx) % self.buckets_per_side, (bucket_y + dy) % self.buckets_per_side))
+        return cells
+
+    def nearest(self, x, y, n=10, unoccupied_only=True, resource=None):
+        bucket_x, bucket_y = (int(value) for value in self.bucket_of((x, y)))
+        max_radius = self.buckets_per_side // 2 + 1
+
+        candidates = []
+        visited = set()
+        distances = np.empty(0)
+        for radius in range(max_radius + 1):
+            # Rings wider than half the map wrap around onto cells that were already visited
+            cells = set(self.ring(bucket_x, bucket_y, radius)) - visited
+            visited |= cells
+            for cell in cells:
+                indices = self.buckets.get(cell)
+                if indices is not None:
+                    candidates.append(indices)
+
+            if not candidates:
+                continue
+
+            indices = np.concatenate(candidates)
+            if unoccupied_only:
+                indices = indices[~self.occupied[indices]]
+            if resource is not None:
+                indices = indices[self.bonuses[indices, RESOURCES.index(resource)] > 0]
+
+            distances = wrap_distance(self.xs[indices], self.ys[indices], x, y)
+            # Anything outside the rings already visited is at least this far away
+            bound = radius * BUCKET_SIZE - self.seam_slack
+            if len(indices) >= n and np.partition(distances, n - 1)[n - 1] <= bound:
+                break
+
+        if not candidates or not len(distances):
+            return []
+
+        count = min(n, len(distances))
+        closest = np.argpartition(distances, count - 1)[:count]
+        closest = closest[np.argsort(distances[closest], kind='stable')]
+
+        return [{
+            "x": int(self.xs[indices[i]]),
+            "y": int(self.ys[indices[i]]),
+            "distance": float(distances[i]),
+            "bonus": dict(zip(RESOURCES, map(int, self.bonuses[indices[i]]))),
+            "occupied": bool(self.occupied[indices[i]]),
+        } for i in closest]
+
+
+class MapScanner:
+    def __init__(self, selenium_manager, radius=25):
+        self.selenium_manager = selenium_manager
+        self.radius = radius
+
+    def get_village_coordinates(self, server):
+        self.selenium_manager.navigate_to(server, PageNames.RESOURCES)
+        driver = self.selenium_manager.get_logged_in_driver(server)
+
+        villages = {}
+        for entry in driver.find_elements(By.XPATH, '//div[@id="sidebarBoxVillagelist"]'
+                                                    '//div[contains(@class, "listEntry")]'):
+            name = entry.find_element(By.XPATH, './/span[@class="name"]').text
+            x = parse_coordinate(entry.find_element(By.XPATH, './/span[@class="coordinateX"]').text)
+            y = parse_coordinate(entry.find_element(By.XPATH, './/span[@class="coordinateY"]').text)
+            villages[name] = (x, y)
+        return villages
+
+    def fetch_block(self, server, x, y):
+        driver = self.selenium_manager.get_logged_in_driver(server)
+        url = self.selenium_manager.servers[server] + MAP_POSITION_ENDPOINT
+
+        throttle(server, Priority.BULK)
+        response = driver.execute_async_script(FETCH_MAP_POSITION_SCRIPT, url, x, y, MAP_ZOOM_LEVEL)
+        if not response or 'error' in response:
+            logger.error("Could not fetch map block at (%s|%s): %s", x, y, response and response.get('error'))
+            return []
+        return response.get('tiles', [])
+
+    def block_centres(self, x, y):
+        offsets = range(-self.radius, self.radius + MAP_BLOCK_SIZE, MAP_BLOCK_SIZE)
+        centres = set()
+        for dx in offsets:
+            for dy in offsets:
+                centres.add((wrap_coordinate(x + min(dx, self.radius)), wrap_coordinate(y + min(dy, self.radius))))
+        return centres
+
+    @log_execution_time
+    def scan(self, server, villages=None):
+        villages = villages or self.get_village_coordinates(server)
+        self.selenium_manager.navigate_to(server, PageNames.MAP)
+
+        centres = set()
+        for x, y in villages.values():
+            centres |= self.block_centres(x, y)
+
+        logger.info("Scanning %s map blocks around %s villages", len(centres), len(villages))
+        oases = {}
+        for x, y in centres:
+            oases.update(parse_oasis_tiles(self.fetch_block(server, x, y)))
+
+        logger.info("Found %s oases", len(oases))
+        return OasisIndex.from_oases(oases)
+
+    def nearest_unoccupied_oases(self, index, villages, n=10):
+        return {name: index.nearest(x, y, n) for name, (x, y) in villages.items()}
@@ -0,0 +1,162 @@
+import numpy as np
+
+try:
+    from scipy import sparse
+    from scipy.optimize import linprog
+except ImportError:
+    linprog = None
+
+from utils import logger, log_execution_time
+from map_scanner import wrap_distance
+
+DEFAULT_OASIS_LOOT_PER_HOUR = 40 * 4
+MINIMUM_DISTANCE = 1
+
+# Each village's troop type only gets columns for its best targets, enough to use its troops this many times over
+CANDIDATE_SLACK = 10
+MINIMUM_CANDIDATES = 10
+# Above this many columns the linear program takes too long and the greedy pass is used instead
+MAX_LP_COLUMNS = 10000
+
+
+def allocate_greedy(rates, troops, remaining_loot, priorities=None):
+    # Highest loot rate first, a heuristic that can miss the best allocation when targets compete for villages
+    priorities = rates if priorities is None else priorities
+    counts = np.zeros(rates.shape, dtype=np.int64)
+    order = np.argsort(priorities, axis=None, kind='stable')[::-1]
+    order = order[priorities.ravel()[order] > 0]
+
+    for village, target, troop in zip(*np.unravel_index(order, rates.shape)):
+        if not troops.any():
+            break
+        if troops[village, troop] == 0 or remaining_loot[target] <= 0:
+            continue
+
+        rate = rates[village, target, troop]
+        count = min(int(np.ceil(remaining_loot[target] / rate)), troops[village, troop])
+        counts[village, target, troop] += count
+        troops[village, troop] -= count
+        remaining_loot[target] -= min(count * rate, remaining_loot[target])
+    return counts
+
+
+def candidate_columns(rates, troops, remaining_loot):
+    # Targets far down a troop type's list only matter once the better ones are drained, which needs more troops
+    # than the village has, so they are left out of the linear program
+    order = np.argsort(-rates, axis=1, kind='stable')
+    sorted_rates = np.take_along_axis(rates, order, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        troops_needed = np.nan_to_num(remaining_loot[order] / sorted_rates, posinf=0)
+    troops_before = np.cumsum(troops_needed, axis=1) - troops_needed
+
+    keep = troops_before < CANDIDATE_SLACK * troops[:, None, :]
+    keep[:, :MINIMUM_CANDIDATES, :] = True
+    candidates = np.zeros(rates.shape, dtype=bool)
+    np.put_along_axis(candidates, order, keep, axis=1)
+    return candidates & (rates > 0)
+
+
+def allocate_optimal(rates, troops, remaining_loot):
+    # Maximises total loot per hour as a linear program over troop counts, capped by each target's loot
+    villages, targets, troop_types = np.nonzero(candidate_columns(rates, troops, remaining_loot))
+    if not len(villages):
+        return np.zeros(rates.shape, dtype=np.int64)
+    if len(villages) > MAX_LP_COLUMNS:
+        logger.info("%s raid options are too many for the linear program, allocating greedily", len(villages))
+        return allocate_greedy(rates, troops, remaining_loot)
+
+    values = rates[villages, targets, troop_types]
+    columns = np.arange(len(values))
+    troop_rows = sparse.csr_matrix((np.ones(len(values)), (villages * rates.shape[2] + troop_types, columns)),
+                                   shape=(rates.shape[0] * rates.shape[2], len(values)))
+    loot_rows = sparse.csr_matrix((values, (targets, columns)), shape=(rates.shape[1], len(values)))
+
+    result = linprog(-values, A_ub=sparse.vstack([troop_rows, loot_rows]),
+                     b_ub=np.concatenate([troops.ravel(), remaining_loot]), bounds=(0, None), method='highs')
+    if result.status != 0:
+        logger.warning("Raid allocation couldn't be solved (%s), falling back to greedy", result.message)
+        return allocate_greedy(rates, troops, remaining_loot)
+
+    # Troops only come in whole units, the fractions left over go wherever one more troop adds the most loot
+    counts = np.zeros(rates.shape, dtype=np.int64)
+    counts[villages, targets, troop_types] = np.floor(result.x + 1e-9).astype(np.int64)
+    troops -= counts.sum(axis=1)
+    remaining_loot -= np.minimum((counts * rates).sum(axis=(0, 2)), remaining_loot)
+    marginal_loot = np.minimum(rates, remaining_loot[None, :, None])
+    return counts + allocate_greedy(rates, troops, remaining_loot, marginal_loot)
+
+
+class RaidPlanner:
+    def __init__(self, troops_stats, server_speed=1):
+        self.troop_names = list(troops_stats.keys())
+        self.speeds = np.array([troops_stats[name]["speed"] for name in self.troop_names], dtype=np.float64)
+        self.capacities = np.array([troops_stats[name]["capacity"] for name in self.troop_names], dtype=np.float64)
+        self.server_speed = server_speed
+
+    def travel_hours(self, village_coordinates, target_coordinates):
+        distances = wrap_distance(village_coordinates[:, 0, None], village_coordinates[:, 1, None],
+                                  target_coordinates[None, :, 0], target_coordinates[None, :, 1])
+        distances = np.maximum(distances, MINIMUM_DISTANCE)
+
+        # Shape (villages, targets, troops)
+        with np.errstate(divide='ignore'):
+            return distances[:, :, None] / (self.speeds[None, None, :] * self.server_speed)
+
+    def loot_rates(self, travel_hours):
+        # Loot per hour a single troop brings back when raiding a target continuously
+        with np.errstate(invalid='ignore'):
+            return np.nan_to_num(self.capacities[None, None, :] / (2 * travel_hours))
+
+    def troops_matrix(self, village_names, available_troops):
+        counts = np.zeros((len(village_names), len(self.troop_names)), dtype=np.int64)
+        for i, village in enumerate(village_names):
+            for troop, count in available_troops.get(village, {}).items():
+                if troop in self.troop_names:
+                    counts[i, self.troop_names.index(troop)] = count
+        return counts
+
+    @log_execution_time
+    def plan(self, villages, available_troops, targets):
+        village_names = list(villages.keys())
+        if not village_names or not targets:
+            return []
+
+        village_coordinates = np.array([villages[name] for name in village_names], dtype=np.float64)
+        target_coordinates = np.array([(target["x"], target["y"]) for target in targets], dtype=np.float64)
+        target_loot = np.array([target.get("loot_per_hour", DEFAULT_OASIS_LOOT_PER_HOUR) for target in targets],
+                               dtype=np.float64)
+
+        travel_hours = self.travel_hours(village_coordinates, target_coordinates)
+        rates = self.loot_rates(travel_hours)
+
+        troops = self.troops_matrix(village_names, available_troops)
+        rates[np.broadcast_to((troops == 0)[:, None, :], rates.shape)] = 0
+
+        if linprog is None:
+            logger.warning("scipy isn't installed, raids are allocated greedily and may not be optimal")
+            counts = allocate_greedy(rates, troops, target_loot.copy())
+        else:
+            counts = allocate_optimal(rates, troops, target_loot.copy())
+
+        remaining_loot = target_loot.copy()
+        allocation = []
+        # Faster raids claim a target's loot first, later ones only get what is left
+        order = np.argsort(rates, axis=None, kind='stable')[::-1]
+        order = order[counts.ravel()[order] > 0]
+        for village, target, troop in zip(*np.unravel_index(order, rates.shape)):
+            count = int(counts[village, target, troop])
+            loot_per_hour = min(count * rates[village, target, troop], remaining_loot[target])
+            remaining_loot[target] -= loot_per_hour
+
+            allocation.append({
+                "village": village_names[village],
+                "target": targets[target],
+                "troop": self.troop_names[troop],
+                "count": count,
+                "travel_time": float(travel_hours[village, target, troop]),
+                "loot_per_hour": float(loot_per_hour),
+            })
+
+        total = sum(raid["loot_per_hour"] for raid in allocation)
+        logger.info("Planned %s raids for %.0f loot per hour", len(allocation), total)
+        return allocation
@@ -0,0 +1,84 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from enum import IntEnum
+
+DEFAULT_RATE = 0.5
+DEFAULT_BURST = 5
+DEFAULT_MIN_SPACING = 0.8
+DEFAULT_JITTER = 0.5
+
+
+# Lower values are served first
+class Priority(IntEnum):
+    URGENT = 0
+    NORMAL = 1
+    BULK = 2
+
+
+class TokenBucket:
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_spacing=DEFAULT_MIN_SPACING,
+                 jitter=DEFAULT_JITTER):
+        self.rate = rate
+        self.burst = burst
+        self.min_spacing = min_spacing
+        self.jitter = jitter
+
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.next_allowed = 0.0
+
+        self.condition = threading.Condition()
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.metrics = {priority.name: {"acquired": 0, "waited": 0.0} for priority in Priority}
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def spacing(self):
+        # Log-normal gaps look more like a person clicking around than a fixed interval
+        return self.min_spacing * random.lognormvariate(0, self.jitter)
+
+    def acquire(self, priority=Priority.NORMAL):
+        start_time = time.monotonic()
+        with self.condition:
+            entry = (priority, next(self.sequence))
+            heapq.heappush(self.waiters, entry)
+
+            while True:
+                now = time.monotonic()
+                self.refill(now)
+
+                if self.waiters[0] == entry and self.tokens >= 1 and now >= self.next_allowed:
+                    heapq.heappop(self.waiters)
+                    self.tokens -= 1
+                    self.next_allowed = now + self.spacing()
+
+                    metrics = self.metrics[Priority(priority).name]
+                    metrics["acquired"] += 1
+                    metrics["waited"] += now - start_time
+
+                    self.condition.notify_all()
+                    return now - start_time
+
+                token_wait = max(0.0, (1 - self.tokens) / self.rate)
+                self.condition.wait(max(token_wait, self.next_allowed - now, 0.01))
+
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(server, **kwargs):
+    with rate_limiters_lock:
+        if server not in rate_limiters:
+            rate_limiters[server] = TokenBucket(**kwargs)
+        return rate_limiters[server]
+
+
+def throttle(server, priority=Priority.NORMAL):
+    return get_rate_limiter(server).acquire(priority)
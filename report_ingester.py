@@ -0,0 +1,183 @@
+import re
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+
+from utils import logger, log_execution_time, retry
+from selenium_manager import PageNames, SeleniumManager, canonical_server_names
+from rate_limiter import Priority
+from database.db_utils import get_connection_to_database
+from database.reports_db import setup_reports_tables, get_reports_watermark, set_reports_watermark, insert_reports, \
+    get_newest_report_id, get_stored_report_ids
+
+BATCH_SIZE = 200
+MAX_PAGES = 500
+
+RESOURCES = ['lumber', 'clay', 'iron', 'crop']
+
+
+def parse_int(text):
+    digits = re.sub(r'[^\d\-]', '', (text or '').replace('−', '-'))
+    return int(digits) if digits not in ('', '-') else 0
+
+
+def parse_report_id(href):
+    match = re.search(r'id=(\d+)', href or '')
+    return int(match.group(1)) if match else None
+
+
+@retry
+def get_report_list_entries(driver):
+    entries = []
+    for row in driver.find_elements(By.XPATH, '//table[@id="overview"]/tbody/tr'):
+        links = row.find_elements(By.XPATH, './td[contains(@class, "sub")]//a[contains(@href, "id=")]')
+        if not links:
+            continue
+
+        href = links[0].get_attribute('href')
+        dates = row.find_elements(By.XPATH, './td[contains(@class, "dat")]')
+        entries.append((parse_report_id(href), href, dates[0].text if dates else None))
+    return entries
+
+
+def get_unit_counts(table, row_class):
+    cells = table.find_elements(By.XPATH, f'./tbody[contains(@class, "{row_class}")]/tr/td[contains(@class, "unit")]')
+    return sum(parse_int(cell.text) for cell in cells)
+
+
+def parse_report(driver, report_id, received):
+    wrapper = driver.find_element(By.ID, 'reportWrapper')
+
+    coordinates = None
+    for link in wrapper.find_elements(By.XPATH, './/div[contains(@class, "defender")]//a[contains(@href, "x=")]'):
+        match = re.search(r'x=(-?\d+)&y=(-?\d+)', link.get_attribute('href'))
+        if match:
+            coordinates = int(match.group(1)), int(match.group(2))
+            break
+
+    loot = [0] * len(RESOURCES)
+    loot_values = wrapper.find_elements(By.XPATH, './/div[contains(@class, "additionalInformation")]'
+                                                  '//div[contains(@class, "resources")]//span[@class="value"]')
+    for i, value in enumerate(loot_values[:len(RESOURCES)]):
+        loot[i] = parse_int(value.text)
+
+    capacity = 0
+    carry = wrapper.find_elements(By.XPATH, './/div[contains(@class, "carry")]')
+    if carry:
+        capacity = parse_int(carry[0].text.split('/')[-1])
+
+    troops_sent = troops_lost = 0
+    attacker = wrapper.find_elements(By.XPATH, './/table[contains(@id, "attacker")]')
+    if attacker:
+        troops_sent = get_unit_counts(attacker[0], 'units last')
+        troops_lost = get_unit_counts(attacker[0], 'units casualties')
+
+    row = {
+        "report_id": report_id,
+        "received": received,
+        "x": coordinates[0] if coordinates else None,
+        "y": coordinates[1] if coordinates else None,
+        "capacity": capacity,
+        "troops_sent": troops_sent,
+        "troops_lost": troops_lost,
+        "defended": troops_lost > 0,
+    }
+    row.update(zip(RESOURCES, loot))
+    return row
+
+
+class ReportIngester:
+    def __init__(self, selenium_manager, batch_size=BATCH_SIZE):
+        self.selenium_manager = selenium_manager
+        self.batch_size = batch_size
+
+    def new_report_entries(self, server, watermark, is_stored):
+        # Returns whether paging got all the way back to the watermark
+        base_url = SeleniumManager.build_url(server, PageNames.REPORTS)
+
+        page = pages_read = 0
+        while pages_read < MAX_PAGES:
+            page += 1
+            driver = self.selenium_manager.load_url(server, f"{base_url}?page={page}", Priority.BULK)
+            entries = [entry for entry in get_report_list_entries(driver) if entry[0] is not None]
+            if not entries:
+                return True
+
+            reached_watermark = any(report_id <= watermark for report_id, _, _ in entries)
+            entries = [entry for entry in entries if entry[0] > watermark]
+            # A run cut short by the page cap stored these already, only the list page is loaded for them again
+            stored = is_stored([report_id for report_id, _, _ in entries])
+            entries = [entry for entry in entries if entry[0] not in stored]
+
+            yield from entries
+            if reached_watermark:
+                return True
+            # Only pages that opened reports count, so a catch-up run isn't stuck behind what it already stored
+            pages_read += bool(entries)
+
+        logger.warning("Stopped after %s report pages on %s without reaching report %s", MAX_PAGES, server, watermark)
+        return False
+
+    def read_report(self, server, report_id, href, received):
+        # Entries are plain tuples read off the list page, so opening a report doesn't leave them stale
+        driver = self.selenium_manager.load_url(server, href, Priority.BULK)
+        try:
+            return parse_report(driver, report_id, received)
+        except WebDriverException as e:
+            # Deleted reports and unfamiliar layouts would fail the same way every time, so they are skipped
+            logger.error("Skipping report %s on %s, could not parse it: %s", report_id, server, e.msg)
+            return None
+
+    @log_execution_time
+    def ingest(self, server):
+        canonical_server = canonical_server_names[server]
+
+        conn = get_connection_to_database()
+        cursor = conn.cursor()
+        setup_reports_tables(cursor)
+
+        watermark = get_reports_watermark(cursor, canonical_server)
+        logger.info("Ingesting reports newer than %s for %s", watermark, server)
+
+        count = 0
+        rows = []
+        def is_stored(report_ids):
+            return get_stored_report_ids(cursor, canonical_server, report_ids)
+
+        entries = self.new_report_entries(server, watermark, is_stored)
+        while True:
+            try:
+                report_id, href, received = next(entries)
+            except StopIteration as stop:
+                complete = stop.value
+                break
+
+            row = self.read_report(server, report_id, href, received)
+            if row is None:
+                continue
+            row["server"] = canonical_server
+            rows.append(row)
+
+            if len(rows) >= self.batch_size:
+                insert_reports(cursor, rows)
+                conn.commit()
+                count += len(rows)
+                rows = []
+
+        insert_reports(cursor, rows)
+        count += len(rows)
+
+        # Only moved once every report down to the old watermark is stored, otherwise the gap would never be read
+        if complete:
+            # Reports stored by earlier runs that were cut short are skipped, not read, so they count as well
+            newest = get_newest_report_id(cursor, canonical_server)
+            set_reports_watermark(cursor, canonical_server, max(watermark, newest))
+        else:
+            logger.warning("Keeping the report watermark for %s at %s, the next run skips the reports stored so far "
+                           "and carries on below them", server, watermark)
+        conn.commit()
+
+        cursor.close()
+        conn.close()
+        logger.info("Ingested %s reports for %s", count, server)
+        return count
@@ -0,0 +1,169 @@
+import re
+import threading
+import time
+
+import numpy as np
+from selenium.webdriver.common.by import By
+
+from utils import logger, executor
+from selenium_manager import PageNames, SeleniumManager
+
+RESOURCES = ['lumber', 'clay', 'iron', 'crop']
+
+STOCK = slice(0, 4)
+CAPACITY = slice(4, 8)
+PRODUCTION = slice(8, 12)
+SAMPLE_WIDTH = 12
+
+DEFAULT_HISTORY = 1024
+DEFAULT_INTERVAL = 600
+
+READ_RESOURCES_SCRIPT = """
+if (typeof resources === 'undefined') {
+    return null;
+}
+return {production: resources.production, storage: resources.storage, maxStorage: resources.maxStorage};
+"""
+
+
+class RingBuffer:
+    def __init__(self, capacity=DEFAULT_HISTORY, width=SAMPLE_WIDTH):
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, width), dtype=np.float64)
+        self.capacity = capacity
+        self.count = 0
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, values):
+        with self.lock:
+            self.timestamps[self.next] = timestamp
+            self.values[self.next] = values
+            self.next = (self.next + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        with self.lock:
+            if not self.count:
+                return None, None
+            index = (self.next - 1) % self.capacity
+            return self.timestamps[index], self.values[index].copy()
+
+    def ordered(self):
+        with self.lock:
+            indices = (np.arange(self.count) + self.next - self.count) % self.capacity
+            return self.timestamps[indices], self.values[indices]
+
+
+def read_resources(driver):
+    state = driver.execute_script(READ_RESOURCES_SCRIPT)
+    if not state:
+        return None
+
+    sample = np.zeros(SAMPLE_WIDTH, dtype=np.float64)
+    for i in range(len(RESOURCES)):
+        key = f"l{i + 1}"
+        sample[STOCK][i] = state["storage"][key]
+        sample[CAPACITY][i] = state["maxStorage"][key]
+        # l5 is the crop production after upkeep, which is what actually fills the granary
+        sample[PRODUCTION][i] = state["production"]["l5" if i == 3 else key]
+    return sample
+
+
+class ResourceMonitor:
+    def __init__(self, selenium_manager, history=DEFAULT_HISTORY, interval=DEFAULT_INTERVAL):
+        self.selenium_manager = selenium_manager
+        self.history = history
+        self.interval = interval
+        # Keyed by (server, village), village names are only unique within a server
+        self.buffers = {}
+        self.lock = threading.Lock()
+        self.stop_events = {}
+
+    def get_buffer(self, server, village):
+        with self.lock:
+            key = (server, village)
+            if key not in self.buffers:
+                self.buffers[key] = RingBuffer(self.history)
+            return self.buffers[key]
+
+    def get_village_ids(self, server):
+        self.selenium_manager.navigate_to(server, PageNames.RESOURCES)
+        driver = self.selenium_manager.get_logged_in_driver(server)
+
+        villages = {}
+        for entry in driver.find_elements(By.XPATH, '//div[@id="sidebarBoxVillagelist"]'
+                                                    '//div[contains(@class, "listEntry")]//a[contains(@href, "newdid")]'):
+            match = re.search(r'newdid=(\d+)', entry.get_attribute('href'))
+            if match:
+                villages[entry.text.split('\n')[0]] = match.group(1)
+        return villages
+
+    def sample(self, server, villages=None):
+        villages = villages or self.get_village_ids(server)
+        url = SeleniumManager.build_url(server, PageNames.RESOURCES)
+
+        for village, village_id in villages.items():
+            driver = self.selenium_manager.load_url(server, f"{url}?newdid={village_id}")
+            values = read_resources(driver)
+            if values is None:
+                logger.error("Could not read resources for %s", village)
+                continue
+            self.get_buffer(server, village).append(time.time(), values)
+
+    def run(self, server, stop_event, villages=None):
+        while not stop_event.is_set():
+            try:
+                self.sample(server, villages)
+            except Exception as e:
+                # A stale page or failed navigation only costs this round, schedulers rely on sampling going on
+                logger.error("Sampling resources on %s failed: %s", server, e)
+            stop_event.wait(self.interval)
+
+    def start(self, server, villages=None):
+        # Each server's run has its own stop event, so stopping one leaves the others sampling
+        stop_event = threading.Event()
+        with self.lock:
+            previous = self.stop_events.get(server)
+            self.stop_events[server] = stop_event
+        if previous:
+            previous.set()
+        return executor.submit(self.run, server, stop_event, villages)
+
+    def stop(self, server=None):
+        with self.lock:
+            servers = [server] if server is not None else list(self.stop_events)
+            stop_events = [self.stop_events.pop(key) for key in servers if key in self.stop_events]
+        for stop_event in stop_events:
+            stop_event.set()
+
+    # QUERIES
+    def latest(self, server, village):
+        return self.get_buffer(server, village).latest()
+
+    def estimated_stock(self, server, village, at=None):
+        timestamp, values = self.latest(server, village)
+        if timestamp is None:
+            return None
+
+        hours = ((at or time.time()) - timestamp) / 3600
+        stock = values[STOCK] + values[PRODUCTION] * hours
+        return np.clip(stock, 0, values[CAPACITY])
+
+    def time_to_overflow(self, server, village):
+        timestamp, values = self.latest(server, village)
+        if timestamp is None:
+            return None
+
+        production = values[PRODUCTION]
+        free = values[CAPACITY] - self.estimated_stock(server, village)
+        with np.errstate(divide='ignore'):
+            hours = np.where(production > 0, free / production, np.inf)
+        return dict(zip(RESOURCES, hours * 3600))
+
+    def production_history(self, server, village):
+        timestamps, values = self.get_buffer(server, village).ordered()
+        return timestamps, values[:, PRODUCTION]
@@ -1,5 +1,8 @@
+from contextlib import contextmanager
 from enum import Enum
+from functools import wraps
 import re
+import threading
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -8,6 +11,8 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium import webdriver
 
 from utils import retry, logger, log_execution_time
+from rate_limiter import throttle, Priority
+from dom_waits import wait_for
 from database.db_utils import get_login_info
 
 WAIT_TIME = 4
@@ -84,7 +89,7 @@ def get_travian_buildings_data():
 
     buildings = driver.find_elements(By.CLASS_NAME, 'build_list__item')
 
-    logger.info(f"Found {len(buildings)} buildings")
+    logger.info("Found %s buildings", len(buildings))
     building_count = 0
     for building in buildings:
         if building.get_attribute('style') == 'display: none;':
@@ -94,7 +99,7 @@ def get_travian_buildings_data():
         building.click()
 
         building_count += 1
-        logger.info(f"Processing building number {building_count}: {name}")
+        logger.info("Processing building number %s: %s", building_count, name)
 
         requirements_div = driver.find_element(By.ID, 'data_holder-req')
 
@@ -143,13 +148,13 @@ def get_travian_troops_data():
     statistics = []
     prices = []
 
-    logger.info(f"Found {len(table)} troops")
+    logger.info("Found %s troops", len(table))
     count = 0
     for row in table:
         name = get_value(row, 2)
 
         count += 1
-        logger.info(f"Processing troop number {count}: {name}")
+        logger.info("Processing troop number %s: %s", count, name)
 
         stats = [name]
         price = [name]
@@ -203,13 +208,25 @@ def get_farm_link(farm):
     return farm.find_element(By.XPATH, './td[3]/a')
 
 
+def holds_driver(method):
+    # For operations that keep WebElements across several calls, the watchdog won't recycle the driver under them
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        server = kwargs['server'] if 'server' in kwargs else args[0]
+        with self.holding_driver(server):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class SeleniumManager:
     servers = {
         EUROPE_100: EUROPE_100_URL,
         INTERNATIONAL_5: INTERNATIONAL_5_URL
     }
 
-    def __init__(self):
+    def __init__(self, account=None):
+        self.account = account
         self.drivers = {
             EUROPE_100: None,
             INTERNATIONAL_5: None
@@ -222,18 +239,27 @@ class SeleniumManager:
             EUROPE_100: False,
             INTERNATIONAL_5: False
         }
+        self.driver_locks = {
+            EUROPE_100: threading.RLock(),
+            INTERNATIONAL_5: threading.RLock()
+        }
+
+    @contextmanager
+    def holding_driver(self, server):
+        with self.driver_locks[server]:
+            yield
 
     @staticmethod
     def build_url(server, page):
         if server not in SeleniumManager.servers.keys():
-            logger.error(f"Server {server} not valid")
+            logger.error("Server %s not valid", server)
             return None
 
         return SeleniumManager.servers[server] + '/' + url_suffixes[page]
 
     # PAGE NAVIGATION
     def login(self, server):
-        logger.info(f"Logging into {server}")
+        logger.info("Logging into %s", server)
         driver = self.get_driver(server)
         logger.debug("Driver acquired")
 
@@ -241,8 +267,8 @@ class SeleniumManager:
             logger.error("Could not get driver")
             return
 
-        username, password = get_login_info(canonical_server_names[server])
-        logger.info(f"Logging into {username}, with password {password}")
+        username, password = get_login_info(canonical_server_names[server], self.account)
+        logger.info("Logging into %s", username)
 
         name_field = driver.find_element(By.NAME, 'name')
         password_field = driver.find_element(By.NAME, 'password')
@@ -251,6 +277,7 @@ class SeleniumManager:
         password_field.send_keys(password)
 
         login_button = driver.find_element(By.XPATH, '//button[@value="Login"]')
+        throttle(server, Priority.URGENT)
         login_button.click()
         self.is_logged_in[server] = True
 
@@ -259,13 +286,14 @@ class SeleniumManager:
 
     def get_driver(self, server):
         if not self.is_valid_server(server):
-            logger.error(f"Server {server} not valid")
+            logger.error("Server %s not valid", server)
             return None
 
         if not self.drivers[server]:
-            logger.info(f"Driver for {server} doesn't exist")
+            logger.info("Driver for %s doesn't exist", server)
             logger.info("Creating new driver")
             driver = webdriver.Firefox()
+            throttle(server, Priority.URGENT)
             driver.get(SeleniumManager.servers[server])
             self.drivers[server] = driver
             return driver
@@ -273,7 +301,7 @@ class SeleniumManager:
 
     def close_driver(self, server):
         if not self.is_valid_server(server):
-            logger.error(f"Server {server} not valid")
+            logger.error("Server %s not valid", server)
             return None
 
         driver = self.drivers[server]
@@ -295,7 +323,7 @@ class SeleniumManager:
 
     def get_wait(self, server):
         if not self.is_valid_server(server):
-            logger.error(f"Server {server} not valid")
+            logger.error("Server %s not valid", server)
             return None
 
         if self.waits[server]:
@@ -306,9 +334,13 @@ class SeleniumManager:
         self.waits[server] = wait
         return wait
 
-    def navigate_to(self, server, page):
+    def wait_for(self, server, locator, find_all=False):
+        driver = self.get_driver(server)
+        return wait_for(driver, locator, WAIT_TIME, find_all, fallback=self.get_wait(server))
+
+    def navigate_to(self, server, page, priority=Priority.NORMAL):
         if not self.is_valid_server(server):
-            logger.error(f"Server {server} not valid")
+            logger.error("Server %s not valid", server)
             return None
 
         url = self.build_url(server, page)
@@ -317,29 +349,33 @@ class SeleniumManager:
             return
 
         if driver.current_url != url:
+            throttle(server, priority)
             driver.get(url)
 
+    def load_url(self, server, url, priority=Priority.NORMAL):
+        driver = self.get_logged_in_driver(server)
+        if not driver:
+            return None
+
+        throttle(server, priority)
+        driver.get(url)
+        return driver
+
     # ELEMENTS FETCHING
     @retry
     def get_farm_list(self, server, index):
         self.navigate_to(server, PageNames.FARM_LIST)
 
-        wait = self.get_wait(server)
-        return wait.until(
-            EC.presence_of_element_located((By.XPATH,
-                                            '//div[@id="rallyPointFarmList"]/div[@class="villageWrapper "]'
-                                            f'/div[@data-sortindex="{index}"]'
-                                            '/div'))
-        )
+        return self.wait_for(server, (By.XPATH, '//div[@id="rallyPointFarmList"]/div[@class="villageWrapper "]'
+                                                f'/div[@data-sortindex="{index}"]'
+                                                '/div'))
 
+    @holds_driver
     def get_all_farm_lists_by_village(self, server):
         self.navigate_to(server, PageNames.FARM_LIST)
-        wait = self.get_wait(server)
 
         farm_lists_by_village = {}
-        villages = wait.until(
-            EC.presence_of_all_elements_located((By.CLASS_NAME, 'villageWrapper'))
-        )
+        villages = self.wait_for(server, (By.CLASS_NAME, 'villageWrapper'), find_all=True)
 
         def parse_village(village):
             village_name = get_farm_list_village_name(village)
@@ -363,21 +399,13 @@ class SeleniumManager:
     @retry
     def get_building_slots(self, server):
         self.navigate_to(server, PageNames.BUILDINGS)
-        wait = self.get_wait(server)
-
-        village_content = wait.until(
-            EC.presence_of_element_located((By.ID, 'villageContent'))
-        )
+        village_content = self.wait_for(server, (By.ID, 'villageContent'))
         return village_content.find_elements(By.TAG_NAME, 'div')
 
     @retry
     def get_building_list(self, server):
         self.navigate_to(server, PageNames.BUILDINGS)
-        wait = self.get_wait(server)
-
-        return wait.until(
-            EC.presence_of_all_elements_located((By.ID, 'buildingList'))
-        )
+        return self.wait_for(server, (By.ID, 'buildingList'), find_all=True)
 
     """ Must be called after navigating to building """
     @retry
@@ -393,6 +421,7 @@ class SeleniumManager:
         driver = self.get_logged_in_driver(server)
         wait = self.get_wait(server)
 
+        throttle(server, Priority.BULK)
         action = webdriver.ActionChains(driver)
         action.key_down(Keys.CONTROL).click(farm_link).key_up(Keys.CONTROL).perform()
         wait.until(EC.number_of_windows_to_be(2))
@@ -400,13 +429,10 @@ class SeleniumManager:
     """ Must be called after navigating to farm location """
     @retry
     def farm_is_undefended(self, server):
-        wait = self.get_wait(server)
-
-        troops = wait.until(
-            EC.presence_of_element_located((By.XPATH, '//table[@id="troop_info"]/tbody/tr[1]/td'))
-        )
+        troops = self.wait_for(server, (By.XPATH, '//table[@id="troop_info"]/tbody/tr[1]/td'))
         return troops.text == 'none'
 
+    @holds_driver
     def select_farm_if_undefended(self, server, farm):
         driver = self.get_logged_in_driver(server)
 
@@ -428,11 +454,13 @@ class SeleniumManager:
 
         unhighlight(farm, original_style, driver)
 
+    @holds_driver
     def select_undefended_farms(self, server, farms):
         for farm in farms:
             self.select_farm_if_undefended(server, farm)
 
     @log_execution_time
+    @holds_driver
     def select_undefended_oases_farms(self, server):
         farm_lists_by_village = self.get_all_farm_lists_by_village(server)
 
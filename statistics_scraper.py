@@ -0,0 +1,210 @@
+import concurrent.futures
+import multiprocessing
+import os
+import re
+import time
+import urllib.request
+from html.parser import HTMLParser
+
+import numpy as np
+
+from utils import logger, log_execution_time
+from selenium_manager import PageNames, SeleniumManager
+from rate_limiter import throttle, Priority
+
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = 20
+
+# column: (cell class, value taken from the cell, numpy type)
+RANKING_COLUMNS = {
+    "player": {
+        "id": ("pla", "link", np.int32),
+        "rank": ("ra", "text", np.int32),
+        "alliance_id": ("al", "link", np.int32),
+        "population": ("pop", "text", np.int32),
+        "villages": ("vil", "text", np.int16),
+    },
+    "alliance": {
+        "id": ("al", "link", np.int32),
+        "rank": ("ra", "text", np.int32),
+        "members": ("pla", "text", np.int16),
+        "population": ("pop", "text", np.int32),
+    },
+}
+
+NAME_CELLS = {
+    "player": "pla",
+    "alliance": "al",
+}
+
+
+def to_int(text):
+    digits = re.sub(r'[^\d]', '', text or '')
+    return int(digits) if digits else 0
+
+
+class RankingTableParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.row = None
+        self.cell = None
+        self.in_body = False
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == 'tbody':
+            self.in_body = True
+        elif tag == 'tr' and self.in_body:
+            self.row = {}
+        elif tag == 'td' and self.row is not None:
+            classes = (attributes.get('class') or '').split()
+            self.cell = classes[0] if classes else ''
+            self.row[self.cell] = ["", 0]
+        elif tag == 'a' and self.cell is not None:
+            match = re.search(r'/(\d+)(?:$|[?#])|[?&]uid=(\d+)|[?&]aid=(\d+)', attributes.get('href') or '')
+            if match:
+                self.row[self.cell][1] = int(next(group for group in match.groups() if group))
+
+    def handle_endtag(self, tag):
+        if tag == 'td':
+            self.cell = None
+        elif tag == 'tr' and self.row is not None:
+            if self.row:
+                self.rows.append(self.row)
+            self.row = None
+        elif tag == 'tbody':
+            self.in_body = False
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.row[self.cell][0] += data
+
+
+def parse_ranking_page(html, kind):
+    # Runs in the process pool, so it only returns plain lists
+    parser = RankingTableParser()
+    parser.feed(html)
+
+    columns = {column: [] for column in RANKING_COLUMNS[kind]}
+    names = []
+    for row in parser.rows:
+        for column, (cell, source, _) in RANKING_COLUMNS[kind].items():
+            text, link = row.get(cell, ("", 0))
+            columns[column].append(link if source == "link" else to_int(text))
+        names.append(row.get(NAME_CELLS[kind], ("", 0))[0].strip())
+    return columns, names
+
+
+def get_page_count(html):
+    pages = [int(page) for page in re.findall(r'[?&]page=(\d+)', html)]
+    return max(pages, default=1)
+
+
+class RankingSnapshot:
+    def __init__(self, kind, timestamp, columns, names):
+        self.kind = kind
+        self.timestamp = timestamp
+        self.columns = columns
+        self.names = names
+
+        # Sorted by id so snapshots can be aligned with a binary search. Rankings move while the pages are fetched,
+        # so a player can show up on two pages, only the first row read is kept
+        order = np.argsort(self.columns["id"], kind='stable')
+        _, first = np.unique(self.columns["id"][order], return_index=True)
+        order = order[first]
+        self.columns = {column: values[order] for column, values in self.columns.items()}
+        self.names = self.names[order]
+
+    @classmethod
+    def from_pages(cls, kind, timestamp, pages):
+        columns = {column: np.array([value for page_columns, _ in pages for value in page_columns[column]],
+                                    dtype=dtype)
+                   for column, (_, _, dtype) in RANKING_COLUMNS[kind].items()}
+        names = np.array([name for _, page_names in pages for name in page_names], dtype=object)
+        return cls(kind, timestamp, columns, names)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            columns = {column: data[column] for column in RANKING_COLUMNS[str(data["kind"])]}
+            return cls(str(data["kind"]), float(data["timestamp"]), columns, data["names"].astype(object))
+
+    def save(self, path):
+        np.savez_compressed(path, kind=self.kind, timestamp=self.timestamp, names=self.names.astype(str),
+                            **self.columns)
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def diff(self, previous, column="population"):
+        # Change of a column for every id present in both snapshots, computed in one pass
+        if not len(previous):
+            return self.columns["id"][:0], np.empty(0, dtype=np.int64)
+
+        positions = np.searchsorted(previous.columns["id"], self.columns["id"])
+        positions = np.minimum(positions, len(previous) - 1)
+        present = previous.columns["id"][positions] == self.columns["id"]
+
+        ids = self.columns["id"][present]
+        change = (self.columns[column][present].astype(np.int64)
+                  - previous.columns[column][positions[present]].astype(np.int64))
+        return ids, change
+
+    def inactive(self, previous, snapshots=()):
+        # Players whose population didn't grow since the previous snapshot, and in every older one given
+        ids, change = self.diff(previous)
+        inactive = ids[change <= 0]
+        for older in snapshots:
+            older_ids, older_change = previous.diff(older)
+            inactive = np.intersect1d(inactive, older_ids[older_change <= 0], assume_unique=True)
+            previous = older
+        return inactive
+
+
+class StatisticsScraper:
+    def __init__(self, selenium_manager, fetch_workers=FETCH_WORKERS, parse_workers=None):
+        self.selenium_manager = selenium_manager
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or os.cpu_count()
+
+    def get_cookie_header(self, server):
+        driver = self.selenium_manager.get_logged_in_driver(server)
+        return "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in driver.get_cookies())
+
+    def fetch(self, server, url, cookie_header):
+        throttle(server, Priority.BULK)
+        request = urllib.request.Request(url, headers={"Cookie": cookie_header, "User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            return response.read().decode('utf-8', errors='replace')
+
+    @log_execution_time
+    def scrape(self, server, kind="player"):
+        cookie_header = self.get_cookie_header(server)
+        base_url = f"{SeleniumManager.build_url(server, PageNames.STATISTICS)}/{kind}"
+        timestamp = time.time()
+
+        first_page = self.fetch(server, f"{base_url}?page=1", cookie_header)
+        page_count = get_page_count(first_page)
+        logger.info("Scraping %s %s ranking pages from %s", page_count, kind, server)
+
+        # Spawned like the supervisor's workers, forking while the logging listener and fetch threads run isn't safe
+        with concurrent.futures.ThreadPoolExecutor(self.fetch_workers) as fetchers, \
+                concurrent.futures.ProcessPoolExecutor(self.parse_workers,
+                                                       mp_context=multiprocessing.get_context("spawn")) as parsers:
+            parsed = {1: parsers.submit(parse_ranking_page, first_page, kind)}
+
+            fetches = {fetchers.submit(self.fetch, server, f"{base_url}?page={page}", cookie_header): page
+                       for page in range(2, page_count + 1)}
+            for fetch in concurrent.futures.as_completed(fetches):
+                try:
+                    parsed[fetches[fetch]] = parsers.submit(parse_ranking_page, fetch.result(), kind)
+                except Exception as e:
+                    logger.error("Could not fetch %s ranking page %s: %s", kind, fetches[fetch], e)
+
+            # In page order, so a player listed on two pages keeps the row from the earlier one
+            pages = [parsed[page].result() for page in sorted(parsed)]
+
+        snapshot = RankingSnapshot.from_pages(kind, timestamp, pages)
+        logger.info("Scraped %s %s rankings", len(snapshot), kind)
+        return snapshot
@@ -0,0 +1,221 @@
+import itertools
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from utils import logger
+from logging_setup import logging_context
+
+MONITOR_INTERVAL = 1
+MAX_RESTART_DELAY = 60
+SHUTDOWN_TIMEOUT = 30
+# A worker that stays up this long is considered healthy again and restarts without the accumulated backoff
+HEALTHY_UPTIME = 300
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+
+
+def worker_main(server, account, jobs, results):
+    import selenium_manager as SM
+
+    selenium_manager = SM.SeleniumManager(account)
+    key = (server, account)
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+
+            job_id, method, kwargs = job
+            results.put((STARTED, key, job_id, None, 0))
+
+            start_time = time.time()
+            try:
+                with logging_context(server=server, account=account, job=job_id):
+                    result = getattr(selenium_manager, method)(server=server, **kwargs)
+                status = DONE
+            except Exception as e:
+                result = f"{type(e).__name__}: {e}"
+                status = FAILED
+
+            try:
+                pickle.dumps(result)
+            except Exception:
+                # WebElements and similar live objects can't leave the worker
+                result = repr(result)
+            results.put((status, key, job_id, result, time.time() - start_time))
+    finally:
+        selenium_manager.close_driver(server)
+
+
+class WorkerHandle:
+    def __init__(self, server, account, context, collect_results):
+        self.server = server
+        self.account = account
+        self.context = context
+        self.collect_results = collect_results
+        self.pending = {}
+        self.started = set()
+        self.restarts = 0
+        self.restart_at = None
+        self.started_at = None
+        self.metrics = {"submitted": 0, "completed": 0, "failed": 0, "restarts": 0, "busy_time": 0.0}
+        self.jobs = None
+        self.results = None
+        self.process = None
+        self.collector = None
+        self.start()
+
+    def start(self):
+        # A worker killed while writing leaves its queues locked, so every incarnation gets fresh ones
+        self.jobs = self.context.Queue()
+        self.results = self.context.Queue()
+        self.process = self.context.Process(target=worker_main, name=f"worker-{self.server}-{self.account}",
+                                            args=(self.server, self.account, self.jobs, self.results), daemon=True)
+        self.process.start()
+        self.restart_at = None
+        self.started_at = time.time()
+        self.collector = threading.Thread(target=self.collect_results, args=(self, self.results),
+                                          name=f"collector-{self.server}-{self.account}", daemon=True)
+        self.collector.start()
+
+        # Jobs that never reached the dead worker are handed to the new one
+        for job_id, (method, kwargs, _) in self.pending.items():
+            self.jobs.put((job_id, method, kwargs))
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+
+class Supervisor:
+    def __init__(self, start_method="spawn"):
+        self.context = multiprocessing.get_context(start_method)
+        self.workers = {}
+        self.job_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.running = True
+
+        self.monitor = threading.Thread(target=self.monitor_workers, name="supervisor-monitor", daemon=True)
+        self.monitor.start()
+
+    def add_worker(self, server, account=None):
+        key = (server, account)
+        with self.lock:
+            if key not in self.workers:
+                logger.info("Starting worker for %s (%s)", server, account)
+                self.workers[key] = WorkerHandle(server, account, self.context, self.collect_results)
+            return self.workers[key]
+
+    def submit(self, server, method, account=None, **kwargs):
+        if not self.running:
+            raise RuntimeError("Supervisor has been shut down")
+
+        worker = self.add_worker(server, account)
+        future = Future()
+        with self.lock:
+            job_id = next(self.job_ids)
+            worker.pending[job_id] = (method, kwargs, future)
+            worker.metrics["submitted"] += 1
+            if worker.is_alive():
+                worker.jobs.put((job_id, method, kwargs))
+        return future
+
+    def collect_results(self, worker, results):
+        # Keeps reading after shutdown starts, until the worker has exited and its queue is drained
+        while worker.results is results:
+            try:
+                status, _, job_id, result, duration = results.get(timeout=MONITOR_INTERVAL)
+            except queue.Empty:
+                if not self.running and not worker.is_alive():
+                    break
+                continue
+
+            with self.lock:
+                if job_id not in worker.pending:
+                    continue
+
+                if status == STARTED:
+                    worker.started.add(job_id)
+                    continue
+
+                _, _, future = worker.pending.pop(job_id)
+                worker.started.discard(job_id)
+                worker.metrics["busy_time"] += duration
+                worker.metrics["completed" if status == DONE else "failed"] += 1
+
+            if status == DONE:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+
+    def monitor_workers(self):
+        while self.running:
+            time.sleep(MONITOR_INTERVAL)
+            with self.lock:
+                for worker in self.workers.values():
+                    if not self.running:
+                        break
+                    if not worker.is_alive():
+                        self.handle_dead_worker(worker)
+                    elif worker.restarts and time.time() - worker.started_at >= HEALTHY_UPTIME:
+                        worker.restarts = 0
+
+    def handle_dead_worker(self, worker):
+        now = time.time()
+        if worker.restart_at is None:
+            logger.error("Worker for %s (%s) died with exit code %s", worker.server, worker.account,
+                         worker.process.exitcode)
+
+            # Whatever the worker was running when it died may have half happened, so it isn't retried
+            for job_id in worker.started:
+                _, _, future = worker.pending.pop(job_id)
+                worker.metrics["failed"] += 1
+                future.set_exception(RuntimeError(f"Worker for {worker.server} died while running job {job_id}"))
+            worker.started.clear()
+
+            worker.restart_at = now + min(2 ** worker.restarts, MAX_RESTART_DELAY)
+            worker.restarts += 1
+            worker.metrics["restarts"] += 1
+
+        if now >= worker.restart_at:
+            logger.info("Restarting worker for %s (%s)", worker.server, worker.account)
+            worker.start()
+
+    def metrics(self):
+        with self.lock:
+            return {key: dict(worker.metrics, alive=worker.is_alive(), pending=len(worker.pending))
+                    for key, worker in self.workers.items()}
+
+    def shutdown(self):
+        with self.lock:
+            self.running = False
+            workers = list(self.workers.values())
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.jobs.put(None)
+        for worker in workers:
+            worker.process.join(SHUTDOWN_TIMEOUT)
+            if worker.process.is_alive():
+                logger.error("Worker for %s (%s) didn't stop, terminating it", worker.server, worker.account)
+                worker.process.terminate()
+                worker.process.join()
+
+        self.monitor.join()
+        for worker in workers:
+            worker.collector.join()
+
+        # Anything still pending never ran, or its worker had to be terminated
+        for worker in workers:
+            with self.lock:
+                pending = list(worker.pending.items())
+                worker.pending.clear()
+                worker.started.clear()
+                worker.metrics["failed"] += len(pending)
+            for job_id, (_, _, future) in pending:
+                future.set_exception(RuntimeError(f"Supervisor shut down before job {job_id} finished"))
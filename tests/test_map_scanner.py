@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from map_scanner import MAP_RADIUS, RESOURCES, OasisIndex, wrap_distance
+
+
+def brute_force(index, x, y, n, unoccupied_only, resource):
+    mask = np.ones(len(index), dtype=bool)
+    if unoccupied_only:
+        mask &= ~index.occupied
+    if resource is not None:
+        mask &= index.bonuses[:, RESOURCES.index(resource)] > 0
+    distances = wrap_distance(index.xs[mask], index.ys[mask], x, y)
+    return np.sort(distances)[:n]
+
+
+def random_index(rng, size):
+    positions = rng.choice((2 * MAP_RADIUS + 1) ** 2, size=size, replace=False)
+    xs, ys = np.divmod(positions, 2 * MAP_RADIUS + 1)
+    bonuses = rng.choice([0, 25, 50], size=(size, len(RESOURCES)), p=[0.7, 0.2, 0.1])
+    occupied = rng.random(size) < 0.3
+    return OasisIndex(xs - MAP_RADIUS, ys - MAP_RADIUS, bonuses, occupied)
+
+
+def test_wrap_distance_does_not_overflow():
+    assert wrap_distance(np.int16([150]), np.int16([150]), 0, 0)[0] == pytest.approx(212.132, abs=1e-3)
+    assert wrap_distance(np.int16([200]), np.int16([0]), -200, 0)[0] == pytest.approx(1)
+
+
+@pytest.mark.parametrize("unoccupied_only", [True, False])
+@pytest.mark.parametrize("resource", [None, "crop", "iron"])
+def test_nearest_matches_brute_force(unoccupied_only, resource):
+    rng = np.random.default_rng(7)
+    for _ in range(30):
+        index = random_index(rng, int(rng.integers(1, 3000)))
+        queries = [tuple(rng.integers(-MAP_RADIUS, MAP_RADIUS + 1, size=2)) for _ in range(5)]
+        queries += [(MAP_RADIUS, MAP_RADIUS), (-MAP_RADIUS, -MAP_RADIUS), (MAP_RADIUS, -MAP_RADIUS), (0, MAP_RADIUS)]
+        for x, y in queries:
+            n = int(rng.integers(1, 20))
+            found = index.nearest(int(x), int(y), n, unoccupied_only=unoccupied_only, resource=resource)
+            expected = brute_force(index, x, y, n, unoccupied_only, resource)
+
+            assert [oasis["distance"] for oasis in found] == pytest.approx(list(expected))
+            for oasis in found:
+                assert wrap_distance(oasis["x"], oasis["y"], x, y) == pytest.approx(oasis["distance"])
+                assert unoccupied_only is False or not oasis["occupied"]
+                assert resource is None or oasis["bonus"][resource] > 0
+
+
+def test_nearest_on_empty_index():
+    index = OasisIndex([], [], np.empty((0, len(RESOURCES))), [])
+    assert index.nearest(0, 0) == []
@@ -0,0 +1,37 @@
+import pytest
+
+import raid_planner
+from raid_planner import RaidPlanner
+
+TROOPS_STATS = {"Equites Imperatoris": {"speed": 10, "capacity": 100}}
+VILLAGES = {"first": (0, 0), "second": (21, 0)}
+AVAILABLE_TROOPS = {"first": {"Equites Imperatoris": 1}, "second": {"Equites Imperatoris": 1}}
+TARGETS = [{"x": 10, "y": 0, "loot_per_hour": 50}, {"x": -12, "y": 0, "loot_per_hour": 50}]
+
+
+def total_loot(allocation):
+    return sum(raid["loot_per_hour"] for raid in allocation)
+
+
+def test_greedy_takes_the_fastest_raid_first(monkeypatch):
+    monkeypatch.setattr(raid_planner, "linprog", None)
+    allocation = RaidPlanner(TROOPS_STATS).plan(VILLAGES, AVAILABLE_TROOPS, TARGETS)
+    assert total_loot(allocation) == pytest.approx(65.15, abs=0.01)
+
+
+def test_linear_program_finds_the_better_pairing():
+    pytest.importorskip("scipy")
+    allocation = RaidPlanner(TROOPS_STATS).plan(VILLAGES, AVAILABLE_TROOPS, TARGETS)
+
+    assert total_loot(allocation) == pytest.approx(87.12, abs=0.01)
+    assert {(raid["village"], raid["target"]["x"]) for raid in allocation} == {("first", -12), ("second", 10)}
+
+
+def test_troops_are_never_overcommitted():
+    pytest.importorskip("scipy")
+    available_troops = {"first": {"Equites Imperatoris": 3}, "second": {"Equites Imperatoris": 2}}
+    targets = [{"x": x, "y": y} for x in range(-30, 31, 10) for y in range(-30, 31, 10)]
+    allocation = RaidPlanner(TROOPS_STATS).plan(VILLAGES, available_troops, targets)
+
+    for village, troops in available_troops.items():
+        assert sum(raid["count"] for raid in allocation if raid["village"] == village) <= troops["Equites Imperatoris"]
@@ -4,11 +4,22 @@ from functools import wraps, partial
 import logging
 from datetime import datetime
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+
+from logging_setup import setup_logging
+
+setup_logging()
 logger = logging.getLogger("Travian Logger")
 
 executor = concurrent.futures.ThreadPoolExecutor()
 
+RETRY_DELAY = 0.25
+MAX_RETRY_DELAY = 8
+MAX_RETRIES = 10
+
+# The browser behind these is gone, retrying with the same driver or elements can never succeed
+FATAL_ERRORS = (InvalidSessionIdException, NoSuchWindowException)
+
 
 def log_execution_time(func):
     @wraps(func)
@@ -16,16 +27,16 @@ def log_execution_time(func):
         start_time = time.time()
 
         current_time = datetime.now().strftime('%H:%M:%S')
-        logger.info(f'Function {func.__name__} started execution at {current_time}.')
+        logger.info('Function %s started execution at %s.', func.__name__, current_time)
 
         result = func(*args, **kwargs)
 
         current_time = datetime.now().strftime('%H:%M:%S')
-        logger.info(f'Function {func.__name__} finished execution at {current_time}.')
+        logger.info('Function %s finished execution at %s.', func.__name__, current_time)
 
         end_time = time.time()
         execution_time = end_time - start_time
-        logger.info(f'Total execution time: {execution_time:4f} seconds')
+        logger.info('Total execution time: %4f seconds', execution_time)
         return result
 
     return wrapper
@@ -34,11 +45,19 @@ def log_execution_time(func):
 def retry(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        while True:
+        delay = RETRY_DELAY
+        for attempt in range(1, MAX_RETRIES + 1):
             try:
                 return func(*args, **kwargs)
+            except FATAL_ERRORS:
+                raise
             except Exception as e:
-                logger.info(f'Function {func.__name__} failed, with error {e}. Retrying...')
+                if attempt == MAX_RETRIES:
+                    logger.error('Function %s failed %s times, giving up: %s', func.__name__, attempt, e)
+                    raise
+                logger.info('Function %s failed, with error %s. Retrying...', func.__name__, e)
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
 
     return wrapper
 
@@ -0,0 +1,164 @@
+import threading
+import time
+from contextlib import contextmanager
+from types import MappingProxyType
+
+from utils import logger
+from selenium_manager import PageNames, SeleniumManager
+
+DEFAULT_TTL = 300
+
+# Reads everything we need off dorf1.php or dorf2.php in a single round trip, returning plain data only
+SNAPSHOT_SCRIPT = """
+const levelOf = element => {
+    const level = element.getAttribute('data-level') || (element.className.match(/level(\\d+)/) || [])[1];
+    return parseInt(level || '0', 10);
+};
+const text = (element, selector) => {
+    const found = element.querySelector(selector);
+    return found ? found.textContent.trim() : '';
+};
+
+const buildings = [];
+document.querySelectorAll('#resourceFieldContainer .resourceField, #villageContent .buildingSlot').forEach(slot => {
+    const aid = slot.getAttribute('data-aid') || (slot.className.match(/buildingSlot(\\d+)/) || [])[1];
+    if (!aid) {
+        return;
+    }
+    const level = slot.querySelector('[data-level], .level');
+    buildings.push({
+        slot: parseInt(aid, 10),
+        gid: parseInt(slot.getAttribute('data-gid') || '0', 10),
+        name: slot.getAttribute('data-name') || '',
+        level: level ? levelOf(level) : levelOf(slot)
+    });
+});
+
+const queue = [];
+document.querySelectorAll('.buildingList li').forEach(entry => {
+    const timer = entry.querySelector('.timer');
+    queue.push({
+        name: text(entry, '.name').replace(/\\s+/g, ' '),
+        finishes_in: timer ? parseInt(timer.getAttribute('value') || '0', 10) : 0
+    });
+});
+
+const troops = {};
+document.querySelectorAll('#troops tbody tr').forEach(row => {
+    const name = text(row, '.un');
+    if (name) {
+        troops[name] = parseInt(text(row, '.num').replace(/[^\\d]/g, '') || '0', 10);
+    }
+});
+
+const resources = typeof window.resources === 'undefined' ? null : {
+    storage: window.resources.storage,
+    maxStorage: window.resources.maxStorage,
+    production: window.resources.production
+};
+
+return {buildings: buildings, queue: queue, troops: troops, resources: resources};
+"""
+
+
+class VillageState:
+    def __init__(self, village_id, buildings, queue, resources, troops, timestamp):
+        self.village_id = village_id
+        self.buildings = MappingProxyType(buildings)
+        self.queue = tuple(queue)
+        self.resources = MappingProxyType(resources)
+        self.troops = MappingProxyType(troops)
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_snapshots(cls, village_id, snapshots):
+        buildings = {}
+        queue = []
+        resources = {}
+        troops = {}
+        for snapshot in snapshots:
+            for building in snapshot["buildings"]:
+                buildings[building["slot"]] = (building["gid"], building["name"], building["level"])
+            queue = snapshot["queue"] or queue
+            resources = snapshot["resources"] or resources
+            troops.update(snapshot["troops"])
+        return cls(village_id, buildings, queue, resources, troops, time.time())
+
+    def age(self):
+        return time.time() - self.timestamp
+
+    def level_of(self, name):
+        return max((level for _, building_name, level in self.buildings.values() if building_name == name), default=0)
+
+    def slots_of(self, name):
+        return [slot for slot, (_, building_name, _) in self.buildings.items() if building_name == name]
+
+    def free_slots(self):
+        return [slot for slot, (gid, _, level) in self.buildings.items() if not level and not gid]
+
+    def queue_is_busy(self):
+        return bool(self.queue)
+
+
+class VillageStateCache:
+    def __init__(self, selenium_manager, ttl=DEFAULT_TTL):
+        self.selenium_manager = selenium_manager
+        self.ttl = ttl
+        self.states = {}
+        self.lock = threading.Lock()
+        self.refresh_locks = {}
+
+    def parse_page(self, server, page, village_id):
+        url = f"{SeleniumManager.build_url(server, page)}?newdid={village_id}"
+        driver = self.selenium_manager.load_url(server, url)
+        return driver.execute_script(SNAPSHOT_SCRIPT)
+
+    def refresh(self, server, village_id):
+        logger.debug("Refreshing state of village %s on %s", village_id, server)
+        snapshots = [self.parse_page(server, PageNames.RESOURCES, village_id),
+                     self.parse_page(server, PageNames.BUILDINGS, village_id)]
+        state = VillageState.from_snapshots(village_id, snapshots)
+
+        with self.lock:
+            self.states[(server, village_id)] = state
+        return state
+
+    def peek(self, server, village_id):
+        # Never touches the browser, safe to call from any thread
+        with self.lock:
+            return self.states.get((server, village_id))
+
+    def is_fresh(self, state):
+        return state is not None and (self.ttl is None or state.age() < self.ttl)
+
+    def refresh_lock(self, server, village_id):
+        with self.lock:
+            return self.refresh_locks.setdefault((server, village_id), threading.Lock())
+
+    def get(self, server, village_id):
+        state = self.peek(server, village_id)
+        if self.is_fresh(state):
+            return state
+
+        # Threads finding the same stale entry wait for one refresh instead of all driving the browser through it
+        with self.refresh_lock(server, village_id):
+            state = self.peek(server, village_id)
+            if self.is_fresh(state):
+                return state
+            return self.refresh(server, village_id)
+
+    def invalidate(self, server, village_id=None):
+        with self.lock:
+            if village_id is not None:
+                self.states.pop((server, village_id), None)
+                return
+            for key in [key for key in self.states if key[0] == server]:
+                self.states.pop(key)
+
+    # SeleniumManager doesn't build, train or send troops yet, whatever does must invalidate the villages it changes
+    @contextmanager
+    def invalidating(self, server, village_id=None):
+        try:
+            yield
+        finally:
+            self.invalidate(server, village_id)